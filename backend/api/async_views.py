@@ -0,0 +1,120 @@
+"""Асинхронные версии самых частых запросов на чтение.
+
+Подключаются в api/urls.py при ASYNC_VIEWS = True, когда приложение
+запущено через ASGI. Запросы с параметрами, которые обрабатывает
+только DRF, и запросы на запись передаются обычным viewset'ам.
+"""
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import HttpResponse
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from recipes.index import ingredient_index
+from recipes.models import Ingredient, Recipe, Tag
+from api.serializers import (IngredientSerializer, RecipeReadSerializer,
+                             TagSerializer)
+from api.services import get_recipes_queryset, get_validators
+from api.views import (IngredientViewSet, RecipeViewSet, TagViewSet,
+                       conditional_response, reference_response)
+
+tag_view = TagViewSet.as_view({"get": "list", "post": "create"})
+ingredient_view = IngredientViewSet.as_view({"get": "list", "post": "create"})
+recipe_view = RecipeViewSet.as_view({
+    "get": "retrieve",
+    "put": "update",
+    "patch": "partial_update",
+    "delete": "destroy",
+})
+
+
+def database_sync_to_async(func):
+    """sync_to_async для кода с запросами к базе.
+
+    В Django 3.2 thread_sensitive=True выполняет синхронный код всех
+    запросов в одном потоке, поэтому код уходит в пул потоков,
+    а соединения закрываются, как после обычного запроса.
+    """
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        except APIException as error:
+            return json_response({"detail": error.detail}, error.status_code)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=False)
+
+
+def json_response(data, status=200):
+    return HttpResponse(
+        JSONRenderer().render(data),
+        status=status,
+        content_type=JSONRenderer.media_type,
+    )
+
+
+def search_ingredients(request, name):
+    etag, _ = get_validators(
+        Ingredient.objects.all(), request.get_full_path()
+    )
+    return conditional_response(
+        request, etag, None,
+        lambda: json_response(IngredientSerializer(
+            ingredient_index.search(name), many=True
+        ).data),
+    )
+
+
+def retrieve_recipe(request, pk):
+    request = Request(request, authenticators=[TokenAuthentication()])
+    queryset = get_recipes_queryset(request.user).filter(pk=pk)
+    etag, last_modified = get_validators(
+        queryset, request.get_full_path(), request.user, detail=True
+    )
+    if etag is None:
+        raise NotFound()
+
+    def render():
+        try:
+            recipe = queryset.get()
+        except Recipe.DoesNotExist:
+            raise NotFound()
+        return json_response(
+            RecipeReadSerializer(recipe, context={"request": request}).data
+        )
+
+    return conditional_response(request, etag, last_modified, render)
+
+
+async def tag_list(request):
+    if request.method != "GET" or request.GET:
+        return await sync_to_async(tag_view)(request)
+    return await database_sync_to_async(reference_response)(
+        request, Tag.objects.all(), TagSerializer
+    )
+
+
+async def ingredient_list(request):
+    if request.method != "GET" or set(request.GET) - {"name"}:
+        return await sync_to_async(ingredient_view)(request)
+    if "name" in request.GET:
+        return await database_sync_to_async(search_ingredients)(
+            request, request.GET["name"]
+        )
+    return await database_sync_to_async(reference_response)(
+        request, Ingredient.objects.all(), IngredientSerializer
+    )
+
+
+async def recipe_detail(request, pk):
+    if request.method != "GET" or request.GET:
+        return await sync_to_async(recipe_view)(request, pk=pk)
+    return await database_sync_to_async(retrieve_recipe)(request, pk)
+
+
+for view in (tag_list, ingredient_list, recipe_detail):
+    view.csrf_exempt = True
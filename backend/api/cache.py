@@ -0,0 +1,70 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+
+VERSION_KEY = "table_version:{}"
+RESPONSE_KEY = "response:{}:{}"
+
+
+def initial_version():
+    """Версия для таблицы, которой ещё нет в кеше.
+
+    Берётся из времени, чтобы после очистки общего кеша версии не
+    повторились и ближний кеш не отдал устаревший ответ.
+    """
+    return time.time_ns()
+
+
+def get_table_versions(tables):
+    """Версии таблиц; меняются при каждой записи в таблицу."""
+    keys = [VERSION_KEY.format(table) for table in tables]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = initial_version()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+            versions[key] = version
+    return [versions[key] for key in keys]
+
+
+def bump_table_versions(*tables):
+    """Меняет версии таблиц после фиксации текущей транзакции.
+
+    Пока транзакция не зафиксирована, другие запросы видят старые
+    строки и закешировали бы их под новой версией.
+    """
+    transaction.on_commit(lambda: _bump_table_versions(tables))
+
+
+def _bump_table_versions(tables):
+    for table in tables:
+        key = VERSION_KEY.format(table)
+        cache.add(key, initial_version(), None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, initial_version(), None)
+
+
+def get_cached_response(name, tables, render):
+    """Готовый ответ (etag, байты) для текущих версий таблиц.
+
+    Сначала ищется в памяти процесса, затем в общем кеше; если его
+    нет нигде, render() строит ответ заново.
+    """
+    versions = get_table_versions(tables)
+    key = RESPONSE_KEY.format(name, "-".join(map(str, versions)))
+    local = caches["local"]
+    cached = local.get(key)
+    if cached is None:
+        cached = cache.get(key)
+        if cached is None:
+            content = render()
+            cached = (f'"{hashlib.md5(content).hexdigest()}"', content)
+            cache.set(key, cached, settings.REFERENCE_CACHE_TIMEOUT)
+        local.set(key, cached, settings.REFERENCE_CACHE_TIMEOUT)
+    return cached
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+from django.core.cache.backends.locmem import LocMemCache
+
+
+@register()
+def shared_cache_check(app_configs, **kwargs):
+    """Общий кеш должен быть общим для всех воркеров.
+
+    Версии таблиц, готовые ответы и отметки о записи для реплик живут
+    в кеше default. В памяти процесса другие воркеры их не видят и
+    отдают устаревшие данные до истечения срока кеша.
+    """
+    backend = settings.CACHES["default"]["BACKEND"]
+    if settings.DEBUG or backend != f"{LocMemCache.__module__}.LocMemCache":
+        return []
+    return [
+        Warning(
+            "Кеш default хранится в памяти процесса.",
+            hint=(
+                "Задайте MEMCACHED_LOCATION, если воркеров больше одного: "
+                "иначе изменения не доходят до кешей других воркеров."
+            ),
+            id="api.W001",
+        )
+    ]
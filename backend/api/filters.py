@@ -1,16 +1,62 @@
-from django_filters.rest_framework import (BooleanFilter, FilterSet,
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Exists, F, OuterRef, Q
+from django_filters.rest_framework import (BooleanFilter, CharFilter,
+                                           FilterSet,
                                            ModelMultipleChoiceFilter)
-from recipes.models import Recipe, Tag
+from recipes.models import IngredientRecipe, Recipe, Tag
+from recipes.services import SEARCH_CONFIG
 
 
 class RecipeFilter(FilterSet):
     tags = ModelMultipleChoiceFilter(
         queryset=Tag.objects.all(),
         field_name="tags__slug",
-        to_field_name="slug"
+        to_field_name="slug",
+        method="filter_tags",
     )
     is_favorited = BooleanFilter(method="filter_is_favorited")
     is_in_shopping_cart = BooleanFilter(method="filter_shopping_cart")
+    search = CharFilter(method="filter_search")
+
+    def filter_tags(self, queryset, name, tags):
+        """Рецепты хотя бы с одним из тегов.
+
+        В Postgres — пересечение с tag_ids по GIN-индексу, без JOIN;
+        на других базах — через таблицу связей.
+        """
+        if not tags:
+            return queryset
+        tag_ids = [tag.id for tag in tags]
+        if connection.vendor != "postgresql":
+            return queryset.filter(tags__in=tag_ids).distinct()
+        return queryset.filter(tag_ids__overlap=tag_ids)
+
+    def filter_search(self, queryset, name, value):
+        """Поиск по названию, описанию и ингредиентам.
+
+        Полноценный поиск есть только в Postgres: полнотекстовый по
+        search_vector, самые подходящие рецепты первыми. На других базах
+        это лишь поиск подстроки без словоформ и ранжирования, а SQLite
+        не различает регистр только у латиницы: «суп» не найдёт «Суп».
+        """
+        value = value.strip()
+        if not value:
+            return queryset
+        if connection.vendor != "postgresql":
+            return queryset.filter(
+                Q(name__icontains=value)
+                | Q(text__icontains=value)
+                | Exists(IngredientRecipe.objects.filter(
+                    recipe=OuterRef("pk"), ingredient__name__icontains=value
+                ))
+            )
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type="websearch"
+        )
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F("search_vector"), query)
+        ).order_by("-rank", "-pub_date", "-id")
 
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
@@ -28,4 +74,6 @@ class RecipeFilter(FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ["author", "tags", "is_favorited", "is_in_shopping_cart"]
+        fields = [
+            "author", "tags", "is_favorited", "is_in_shopping_cart", "search",
+        ]
@@ -1,6 +1,219 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+
+from api.cache import get_table_versions
+from api.services import without_row_annotations
+from api.signals import VERSIONED_TABLES
+
+
+@lru_cache(maxsize=None)
+def get_table_names():
+    tables = set()
+    for model in apps.get_models(include_auto_created=True):
+        tables.add(model._meta.db_table)
+    return frozenset(tables)
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который не считает COUNT(*) на каждый запрос.
+
+    Число строк кешируется по тексту запроса и версиям таблиц, которые
+    в нём участвуют. Для больших таблиц без фильтров в Postgres берётся
+    оценка планировщика из pg_class.reltuples.
+    """
+
+    count_exact = True
+
+    def count_queryset(self):
+        """Запрос без аннотаций, которые не влияют на число строк."""
+        queryset = without_row_annotations(self.object_list)
+        if queryset.query.distinct and not queryset.query.distinct_fields:
+            queryset = queryset.values("pk")
+        return queryset
+
+    def estimate(self, queryset):
+        query = queryset.query
+        connection = connections[queryset.db]
+        if (connection.vendor != "postgresql" or query.where
+                or query.distinct or query.annotations):
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < settings.COUNT_ESTIMATE_MIN_ROWS:
+            return None
+        return int(row[0])
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, "query"):
+            return super().count
+        queryset = self.count_queryset()
+        estimate = self.estimate(queryset)
+        if estimate is not None:
+            self.count_exact = False
+            return estimate
+        sql, params = queryset.query.sql_with_params()
+        tables = sorted(
+            table for table in get_table_names() if f'"{table}"' in sql
+        )
+        if not VERSIONED_TABLES.issuperset(tables):
+            # У таблицы нет версии, кеш не узнал бы о её изменении.
+            return queryset.count()
+        versions = get_table_versions(tables)
+        key = "count:" + hashlib.md5(
+            repr((sql, params, versions)).encode()
+        ).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            # Под версией таблиц сохраняется только число с основной
+            # базы: у отстающей реплики оно ещё старое.
+            count = queryset.using(DEFAULT_DB_ALIAS).count()
+            cache.set(key, count, settings.COUNT_CACHE_TTL)
+        return count
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = "limit"
+    max_page_size = settings.MAX_PAGE_SIZE
+    django_paginator_class = CachedCountPaginator
+
+    def get_paginated_response(self, data):
+        paginator = self.page.paginator
+        return Response(OrderedDict([
+            ("count", paginator.count),
+            ("count_exact", paginator.count_exact),
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data)
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["count_exact"] = {"type": "boolean"}
+        return response_schema
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Курсор по паре (pub_date, id).
+
+    CursorPagination из DRF строит позицию только по первому полю
+    сортировки, а рецепты с одинаковым pub_date пропускает через OFFSET,
+    ограниченный offset_cutoff. Здесь позиция — пара значений, и
+    страница выбирается условием по обоим полям, без OFFSET.
+    """
+
+    page_size = 6
+    page_size_query_param = "limit"
+    max_page_size = settings.MAX_PAGE_SIZE
+    ordering = ("-pub_date", "-id")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request) or Cursor(
+            offset=0, reverse=False, position=None
+        )
+        reverse = self.cursor.reverse
+        if reverse:
+            queryset = queryset.order_by("pub_date", "id")
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if self.cursor.position is not None:
+            pub_date, pk = self.parse_position(self.cursor.position)
+            if reverse:
+                queryset = queryset.filter(
+                    Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, id__gt=pk)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk)
+                )
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        started = self.cursor.position is not None
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = started, has_more
+        else:
+            self.has_next, self.has_previous = has_more, started
+        self.next_position = self.previous_position = None
+        if self.page:
+            self.next_position = self.get_position(self.page[-1])
+            self.previous_position = self.get_position(self.page[0])
+        else:
+            self.has_previous = False
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=self.next_position)
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=self.previous_position)
+        )
+
+    @staticmethod
+    def get_position(recipe):
+        return f"{recipe.pub_date.isoformat()}|{recipe.id}"
+
+    def parse_position(self, position):
+        pub_date, _, pk = position.rpartition("|")
+        try:
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except ValueError:
+            pub_date = None
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, pk
+
+
+class RecipePagination(CustomPagination):
+    """Постраничная выдача рецептов с переходом на курсор.
+
+    Без параметра cursor работает как раньше, по номерам страниц.
+    С ?cursor= (первая страница — с пустым значением) страницы
+    выбираются по индексу (-pub_date, -id), без OFFSET и COUNT(*).
+    """
+
+    cursor_query_param = RecipeCursorPagination.cursor_query_param
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor = None
+        if self.cursor_query_param in request.query_params:
+            self.cursor = RecipeCursorPagination()
+            return self.cursor.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor is not None:
+            return self.cursor.get_paginated_response(data)
+        return super().get_paginated_response(data)
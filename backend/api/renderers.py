@@ -0,0 +1,93 @@
+import csv
+import io
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Формат файла списка покупок.
+
+    Сам файл отдаётся потоком через stream(), render() нужен только
+    для ответов с ошибками.
+    """
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data)
+
+    def stream(self, ingredients):
+        """Файл по частям; по умолчанию — строка на ингредиент."""
+        for ingredient in ingredients:
+            name, measurement_unit, amount = self.row(ingredient)
+            yield f"{name}({measurement_unit}) - {amount}\n"
+
+    @staticmethod
+    def row(ingredient):
+        return (
+            ingredient["ingredient__name"],
+            ingredient["ingredient__measurement_unit"],
+            ingredient["amount"],
+        )
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = "text/plain"
+    format = "txt"
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+    def stream(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ("Ингредиент", "Единица измерения", "Количество")
+        )
+        for ingredient in ingredients:
+            yield writer.writerow(self.row(ingredient))
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    media_type = "application/pdf"
+    format = "pdf"
+    charset = None
+    font_name = "ShoppingList"
+    font_size = 12
+    margin = 50
+
+    def stream(self, ingredients):
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(self.font_name, settings.SHOPPING_LIST_FONT)
+            )
+        buffer = io.BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        width, height = A4
+        leading = self.font_size * 1.5
+        pdf.setFont(self.font_name, self.font_size + 4)
+        pdf.drawString(self.margin, height - self.margin, "Список покупок")
+        y = height - self.margin - 2 * leading
+        pdf.setFont(self.font_name, self.font_size)
+        for ingredient in ingredients:
+            if y < self.margin:
+                pdf.showPage()
+                pdf.setFont(self.font_name, self.font_size)
+                y = height - self.margin
+            name, measurement_unit, amount = self.row(ingredient)
+            pdf.drawString(
+                self.margin, y, f"{name} ({measurement_unit}) — {amount}"
+            )
+            y -= leading
+        pdf.save()
+        yield buffer.getvalue()
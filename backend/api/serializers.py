@@ -1,6 +1,10 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from rest_framework.serializers import ValidationError
-from django.shortcuts import get_object_or_404
 from djoser.serializers import (
     UserCreateSerializer as DjoserUserCreateSerializer)
 from djoser.serializers import UserSerializer as DjoserUserSerialiser
@@ -8,10 +12,28 @@ from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
-from recipes.models import (Ingredient, IngredientRecipe, Recipe, Tag)
+from recipes.images import VARIANTS
+from recipes.models import (ImageUpload, Ingredient, IngredientRecipe,
+                            Recipe, Tag)
+from recipes.services import (bump_recipe_version, rebuild_cart_totals,
+                              update_search_vector)
+from recipes.uploads import (EXTENSIONS, delete_upload, is_image,
+                             save_upload, start_upload)
 from users.models import Follow, User
 
 
+def is_subscribed(request, following):
+    """Берёт аннотацию is_subscribed из queryset, если она есть."""
+    if hasattr(following, "is_subscribed"):
+        return following.is_subscribed
+    if request is None or request.user.is_anonymous:
+        return False
+    return Follow.objects.filter(
+        user=request.user,
+        following=following
+    ).exists()
+
+
 class UserSerializer(DjoserUserSerialiser):
     is_subscribed = serializers.SerializerMethodField()
 
@@ -27,10 +49,7 @@ class UserSerializer(DjoserUserSerialiser):
         )
 
     def get_is_subscribed(self, obj):
-        request = self.context.get("request")
-        if request is None or request.user.is_anonymous:
-            return False
-        return Follow.objects.filter(user=request.user, following=obj).exists()
+        return is_subscribed(self.context.get("request"), obj)
 
 
 class UserCreateSerializer(DjoserUserCreateSerializer):
@@ -95,11 +114,71 @@ class IngredientRecipeCreateSerializer(serializers.ModelSerializer):
         )
 
 
+def get_image_variants(recipe):
+    """Относительные URL вариантов картинки; пока их нет — оригинал."""
+    original = recipe.image.url if recipe.image else None
+    variants = {}
+    for variant in VARIANTS:
+        image = getattr(recipe, f"image_{variant}")
+        variants[variant] = (
+            image.url if recipe.image_processed and image else original
+        )
+    return variants
+
+
+def build_url(request, url):
+    if url is None or request is None:
+        return url
+    return request.build_absolute_uri(url)
+
+
 class ShortRecipeInfoSerializer(serializers.ModelSerializer):
+    image = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
         fields = ("id", "name", "image", "cooking_time")
 
+    def get_image(self, recipe):
+        return build_url(
+            self.context.get("request"),
+            get_image_variants(recipe)["card"]
+        )
+
+
+def recipe_cache_key(recipe):
+    return f"recipe:{recipe.id}:{recipe.version}"
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Собирает страницу из закэшированных фрагментов рецептов.
+
+    Недостающие фрагменты рендерятся одним проходом с общим prefetch.
+    """
+
+    def to_representation(self, data):
+        recipes = list(data.all() if hasattr(data, "all") else data)
+        keys = [recipe_cache_key(recipe) for recipe in recipes]
+        fragments = cache.get_many(keys)
+        missing = [
+            recipe for recipe, key in zip(recipes, keys)
+            if key not in fragments
+        ]
+        if missing:
+            prefetch_related_objects(
+                missing, "tags", "ingredientrecipe_set__ingredient"
+            )
+            rendered = {
+                recipe_cache_key(recipe): self.child.render_fragment(recipe)
+                for recipe in missing
+            }
+            cache.set_many(rendered, settings.RECIPE_CACHE_TIMEOUT)
+            fragments.update(rendered)
+        return [
+            self.child.overlay(recipe, fragments[key], "card")
+            for recipe, key in zip(recipes, keys)
+        ]
+
 
 class RecipeReadSerializer(serializers.ModelSerializer):
     tags = TagSerializer(read_only=True, many=True)
@@ -116,6 +195,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         default=False
     )
     image = Base64ImageField()
+    images = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -128,20 +208,155 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "images",
             "text",
             "cooking_time",
         )
+        list_serializer_class = RecipeListSerializer
+
+    user_fields = ("author", "is_favorited", "is_in_shopping_cart")
+
+    def to_representation(self, recipe):
+        key = recipe_cache_key(recipe)
+        fragment = cache.get(key)
+        if fragment is None:
+            fragment = self.render_fragment(recipe)
+            cache.set(key, fragment, settings.RECIPE_CACHE_TIMEOUT)
+        return self.overlay(recipe, fragment, "detail")
+
+    def get_images(self, recipe):
+        return get_image_variants(recipe)
+
+    def render_fragment(self, recipe):
+        """Часть рецепта, которая не зависит от пользователя."""
+        fragment = dict(super().to_representation(recipe))
+        for field in self.user_fields:
+            del fragment[field]
+        del fragment["image"]
+        return fragment
+
+    def overlay(self, recipe, fragment, variant):
+        """Добавляет к фрагменту данные пользователя и абсолютные URL.
+
+        В поле image отдаётся вариант картинки: card для списков,
+        detail для страницы рецепта.
+        """
+        request = self.context.get("request")
+        images = {
+            name: build_url(request, url)
+            for name, url in fragment["images"].items()
+        }
+        data = dict(
+            fragment,
+            author=self.fields["author"].to_representation(recipe.author),
+            is_favorited=getattr(recipe, "is_favorited", False),
+            is_in_shopping_cart=getattr(recipe, "is_in_shopping_cart", False),
+            image=images[variant],
+            images=images,
+        )
+        return OrderedDict((field, data[field]) for field in self.Meta.fields)
+
+
+def get_in_bulk(queryset, ids):
+    """Объекты по id одним запросом, неизвестные id — ошибка валидации."""
+    objects = queryset.in_bulk(ids)
+    unknown = [pk for pk in ids if pk not in objects]
+    if unknown:
+        raise ValidationError(
+            f'Не найдены объекты с id: {", ".join(map(str, unknown))}'
+        )
+    return objects
+
+
+class InBulkRelatedField(serializers.ManyRelatedField):
+    """Список первичных ключей, который проверяется одним запросом."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+        ids = [
+            serializers.IntegerField().run_validation(pk) for pk in data
+        ]
+        objects = get_in_bulk(self.child_relation.get_queryset(), ids)
+        return [objects[pk] for pk in ids]
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.MAX_BULK_RECIPES,
+    )
+
+    def validate_recipes(self, ids):
+        ids = list(dict.fromkeys(ids))
+        recipes = get_in_bulk(Recipe.objects.all(), ids)
+        return [recipes[pk] for pk in ids]
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    """Загрузка файлом из multipart или создание загрузки по частям."""
+
+    file = serializers.FileField(write_only=True, required=False)
+    name = serializers.CharField(write_only=True, required=False)
+    size = serializers.IntegerField(min_value=1, required=False)
+    completed = serializers.ReadOnlyField()
+
+    class Meta:
+        model = ImageUpload
+        fields = ("id", "file", "name", "size", "received", "completed")
+        read_only_fields = ("received",)
+
+    def validate(self, data):
+        file = data.get("file")
+        if file is not None:
+            name, size = file.name, file.size
+        elif "name" in data and "size" in data:
+            name, size = data["name"], data["size"]
+        else:
+            raise ValidationError(
+                "Передайте file или name и size для загрузки по частям"
+            )
+        if not name.lower().endswith(EXTENSIONS):
+            raise ValidationError(
+                f"Допустимые расширения: {', '.join(EXTENSIONS)}"
+            )
+        if size > settings.MAX_IMAGE_UPLOAD_SIZE:
+            raise ValidationError(
+                f"Файл больше {settings.MAX_IMAGE_UPLOAD_SIZE} байт"
+            )
+        return data
+
+    def create(self, validated_data):
+        user = self.context["request"].user
+        if "file" not in validated_data:
+            return start_upload(
+                user, validated_data["name"], validated_data["size"]
+            )
+        upload = save_upload(user, validated_data["file"])
+        if not is_image(upload):
+            delete_upload(upload)
+            raise ValidationError({"file": "Файл не является картинкой"})
+        return upload
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     ingredients = IngredientRecipeCreateSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True,
+    tags = InBulkRelatedField(
+        child_relation=serializers.PrimaryKeyRelatedField(
+            queryset=Tag.objects.all()
+        ),
         required=True,
     )
     author = UserSerializer(read_only=True)
-    image = Base64ImageField()
+    image = Base64ImageField(required=False)
+    image_upload = serializers.PrimaryKeyRelatedField(
+        queryset=ImageUpload.objects.all(),
+        write_only=True,
+        required=False,
+    )
     cooking_time = serializers.IntegerField()
 
     class Meta:
@@ -151,17 +366,45 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             "ingredients",
             "tags",
             "image",
+            "image_upload",
             "name",
             "text",
             "cooking_time",
         )
 
+    def validate_image_upload(self, upload):
+        request = self.context.get("request")
+        if upload.user_id != request.user.id or not upload.completed:
+            raise ValidationError("Загрузка не найдена или не завершена")
+        return upload
+
+    def validate(self, data):
+        if "image" in data and "image_upload" in data:
+            raise ValidationError(
+                "Передайте либо image, либо image_upload"
+            )
+        if self.instance is None and not (
+                data.get("image") or "image_upload" in data):
+            raise ValidationError({"image": "Обязательное поле."})
+        return data
+
+    @staticmethod
+    def take_upload(validated_data):
+        """Подставляет файл загрузки в image без копирования."""
+        upload = validated_data.pop("image_upload", None)
+        if upload is not None:
+            validated_data["image"] = upload.file.name
+            upload.delete()
+
     def validate_ingredients(self, ingredients):
         ingredients_list = [ingredient['id'] for ingredient in ingredients]
         if len(ingredients_list) != len(set(ingredients_list)):
             raise ValidationError(
                 'Ингредиенты не должны повторяться'
             )
+        objects = get_in_bulk(Ingredient.objects.all(), ingredients_list)
+        for ingredient in ingredients:
+            ingredient["ingredient"] = objects[ingredient["id"]]
         return ingredients
 
     def validate_cooking_time(self, time):
@@ -171,53 +414,115 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             )
         return time
 
+    def create_ingredients(self, recipe, ingredients):
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe=recipe,
+                ingredient=ingredient["ingredient"],
+                amount=ingredient["amount"],
+            )
+            for ingredient in ingredients
+        )
+
     @transaction.atomic
     def create(self, validated_data):
         request = self.context.get("request")
         author = request.user
         ingredients = validated_data.pop("ingredients")
         tags = validated_data.pop("tags")
+        self.take_upload(validated_data)
         recipe = Recipe.objects.create(author=author, **validated_data)
-        ingredients_list = []
-        for ingredient in ingredients:
-            ingredients_list.append(
-                IngredientRecipe(
-                    recipe=recipe,
-                    ingredient=get_object_or_404(
-                        Ingredient,
-                        id=ingredient["id"]
-                    ),
-                    amount=ingredient["amount"],
-                ))
-        IngredientRecipe.objects.bulk_create(ingredients_list)
+        self.create_ingredients(recipe, ingredients)
         recipe.tags.set(tags)
+        update_search_vector(Recipe.objects.filter(pk=recipe.pk))
         return recipe
 
-    @transaction.atomic
-    def update(self, recipe, validated_data):
-        ingredients = validated_data.pop("ingredients")
-        tags = validated_data.pop("tags")
-        IngredientRecipe.objects.filter(recipe=recipe).delete()
-        ingredients_list = []
+    def update_ingredients(self, recipe, ingredients):
+        """Пишет только изменившиеся строки ингредиентов.
+
+        Возвращает id ингредиентов, которые были добавлены, удалены
+        или поменяли количество.
+        """
+        current = {
+            line.ingredient_id: line
+            for line in recipe.ingredientrecipe_set.all()
+        }
+        created, changed = [], []
         for ingredient in ingredients:
-            ingredients_list.append(
-                IngredientRecipe(
+            line = current.pop(ingredient["id"], None)
+            if line is None:
+                created.append(IngredientRecipe(
                     recipe=recipe,
-                    ingredient=get_object_or_404(
-                        Ingredient,
-                        id=ingredient["id"]
-                    ),
+                    ingredient=ingredient["ingredient"],
                     amount=ingredient["amount"],
                 ))
-        IngredientRecipe.objects.bulk_create(ingredients_list)
-        recipe.tags.set(tags)
-        return super().update(recipe, validated_data)
+            elif line.amount != ingredient["amount"]:
+                line.amount = ingredient["amount"]
+                changed.append(line)
+        if current:
+            IngredientRecipe.objects.filter(
+                id__in=[line.id for line in current.values()]
+            ).delete()
+        IngredientRecipe.objects.bulk_update(changed, ["amount"])
+        IngredientRecipe.objects.bulk_create(created)
+        return set(current).union(
+            line.ingredient_id for line in changed + created
+        )
+
+    @staticmethod
+    def is_same_image(stored, uploaded):
+        if not stored:
+            return False
+        try:
+            if stored.size != uploaded.size:
+                return False
+            with stored.open("rb") as file:
+                return file.read() == uploaded.read()
+        except OSError:
+            return False
+        finally:
+            uploaded.seek(0)
+
+    @transaction.atomic
+    def update(self, recipe, validated_data):
+        ingredients = validated_data.pop("ingredients", None)
+        tags = validated_data.pop("tags", None)
+        changed_ingredients = set()
+        if ingredients is not None:
+            changed_ingredients = self.update_ingredients(recipe, ingredients)
+        if changed_ingredients:
+            rebuild_cart_totals(
+                recipe.shopping_list.values("user"),
+                changed_ingredients
+            )
+        if tags is not None:
+            recipe.tags.set(tags)
+        image = validated_data.get("image")
+        if image is not None and self.is_same_image(recipe.image, image):
+            del validated_data["image"]
+        self.take_upload(validated_data)
+        changed_fields = [
+            field for field, value in validated_data.items()
+            if getattr(recipe, field) != value
+        ]
+        for field in changed_fields:
+            setattr(recipe, field, validated_data[field])
+        if "image" in changed_fields:
+            recipe.image_processed = False
+            changed_fields.append("image_processed")
+        if changed_fields:
+            recipe.save(update_fields=changed_fields)
+        elif changed_ingredients:
+            bump_recipe_version(Recipe.objects.filter(pk=recipe.pk))
+        if changed_ingredients or {"name", "text"} & set(changed_fields):
+            update_search_vector(Recipe.objects.filter(pk=recipe.pk))
+        return recipe
 
 
 class UserSubscribeSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     recipes = ShortRecipeInfoSerializer(many=True)
-    recipes_count = serializers.ReadOnlyField(source="following.recipes.count")
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -247,13 +552,4 @@ class UserSubscribeSerializer(serializers.ModelSerializer):
         return data
 
     def get_is_subscribed(self, data):
-        request = self.context.get("request")
-        if request is None or request.user.is_anonymous:
-            return False
-        return Follow.objects.filter(
-            user=request.user,
-            following=data
-        ).exists()
-
-    def get_recipes_count(self, data):
-        return Recipe.objects.filter(author=data.id).count()
+        return is_subscribed(self.context.get("request"), data)
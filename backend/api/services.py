@@ -1,24 +1,127 @@
-from recipes.models import IngredientRecipe
-from django.db.models import Sum
+import hashlib
+
+from recipes.models import CartTotal, Favorite, Recipe, ShoppingCard
+from django.db import IntegrityError, transaction
+from django.db.models import (BooleanField, Exists, OuterRef, Prefetch,
+                              Value)
+from users.models import Follow, User
+
+from api.cache import get_table_versions
+
+# Таблицы, от которых зависят флаги is_favorited, is_in_shopping_cart
+# и is_subscribed в ответах для пользователя.
+USER_STATE_TABLES = [
+    Favorite._meta.db_table,
+    ShoppingCard._meta.db_table,
+    Follow._meta.db_table,
+]
+
+
+def annotate_is_subscribed(queryset, user):
+    """Подписан ли user на каждого автора из queryset, одним подзапросом."""
+    if user.is_anonymous:
+        return queryset.annotate(
+            is_subscribed=Value(False, output_field=BooleanField())
+        )
+    return queryset.annotate(
+        is_subscribed=Exists(
+            Follow.objects.filter(user=user, following=OuterRef("pk"))
+        )
+    )
+
+
+def get_recipes_queryset(user):
+    """Рецепты с автором и флагами избранного и корзины для user."""
+    queryset = Recipe.objects.prefetch_related(
+        Prefetch(
+            "author",
+            queryset=annotate_is_subscribed(User.objects.all(), user)
+        ),
+    )
+    if user.is_authenticated:
+        favorite = Favorite.objects.filter(
+            user=user, recipe=OuterRef("id"))
+        is_in_shopping_cart = ShoppingCard.objects.filter(
+            user=user, recipe=OuterRef("id")
+        )
+        queryset = queryset.annotate(
+            is_favorited=Exists(favorite),
+            is_in_shopping_cart=Exists(is_in_shopping_cart)
+        )
+    return queryset
 
 
 def get_shopping_list(user):
-    ingredients = (
-        IngredientRecipe.objects
-        .filter(recipe__shopping_list__user=user)
+    """Итоги корзины по алфавиту, курсором на сервере.
+
+    Перебирать нужно в синхронном коде, а не в теле ответа ASGI.
+    """
+    return (
+        CartTotal.objects
+        .filter(user=user)
         .values(
             "ingredient__name",
             "ingredient__measurement_unit",
+            "amount",
         )
-        .annotate(amount=Sum("amount"))
+        .order_by("ingredient__name", "ingredient__measurement_unit")
+        .iterator()
     )
 
-    shopping_list = []
 
-    for ingredient in ingredients:
-        shopping_list.append(
-            f'{ingredient["ingredient__name"]}'
-            f'({ingredient["ingredient__measurement_unit"]}) - '
-            f'{ingredient["amount"]}\n'
+def create_once(model, **fields):
+    """Вставка без предварительного SELECT.
+
+    Повтор отсекает уникальный индекс; вставка идёт в точке сохранения,
+    чтобы ошибка не прерывала внешнюю транзакцию. Возвращает True,
+    если строка добавлена, и False, если такая строка уже есть. Другие
+    ошибки целостности, в том числе из сигналов, пробрасываются.
+    """
+    try:
+        with transaction.atomic():
+            model.objects.create(**fields)
+    except IntegrityError:
+        if model.objects.filter(**fields).exists():
+            return False
+        raise
+    return True
+
+
+def without_row_annotations(queryset):
+    """Тот же набор строк без аннотаций, которые на него не влияют."""
+    queryset = queryset.order_by()
+    queryset.query.annotations = {
+        alias: annotation
+        for alias, annotation in queryset.query.annotations.items()
+        if annotation.contains_aggregate
+    }
+    return queryset
+
+
+def get_validators(queryset, path, user=None, detail=False):
+    """ETag и Last-Modified выборки без агрегатов и сериализации.
+
+    Список версионируется общей версией таблицы модели из кеша, один
+    объект — своим updated_at: сигналы и services сдвигают его и при
+    изменении тегов, ингредиентов и автора. Если передан user,
+    учитываются его id и версии таблиц избранного, корзины и подписок.
+    Last-Modified возвращается только для одного объекта. Если объекта
+    нет, возвращает (None, None).
+    """
+    parts = [path]
+    last_modified = None
+    if detail:
+        last_modified = (
+            without_row_annotations(queryset)
+            .values_list("updated_at", flat=True)
+            .first()
         )
-    return shopping_list
+        if last_modified is None:
+            return None, None
+        parts.append(last_modified.isoformat())
+    else:
+        parts.append(get_table_versions([queryset.model._meta.db_table]))
+    if user is not None and user.is_authenticated:
+        parts += [user.pk, get_table_versions(USER_STATE_TABLES)]
+    etag = f'"{hashlib.md5(repr(parts).encode()).hexdigest()}"'
+    return etag, last_modified
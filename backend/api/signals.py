@@ -0,0 +1,32 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from api.cache import bump_table_versions
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCard, Tag)
+from users.models import Follow, User
+
+# Модели, версии таблиц которых где-то читаются: ETag, кеш справочников
+# и числа строк. Запись в остальные таблицы (сессии, токены, загрузки
+# картинок) версий не сдвигает.
+VERSIONED_MODELS = (
+    Recipe, Recipe.tags.through, Tag, Ingredient, IngredientRecipe,
+    Favorite, ShoppingCard, Follow, User,
+)
+VERSIONED_TABLES = frozenset(
+    model._meta.db_table for model in VERSIONED_MODELS
+)
+
+
+def table_changed(sender, **kwargs):
+    bump_table_versions(sender._meta.db_table)
+
+
+def m2m_table_changed(sender, action, **kwargs):
+    if action.startswith("post_"):
+        bump_table_versions(sender._meta.db_table)
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(table_changed, sender=model)
+    post_delete.connect(table_changed, sender=model)
+    m2m_changed.connect(m2m_table_changed, sender=model)
@@ -1,4 +1,7 @@
-from api.views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from api.views import (DatabasePoolView, ImageUploadViewSet,
+                       IngredientViewSet, RecipeViewSet, TagViewSet,
+                       UserViewSet)
+from django.conf import settings
 from django.urls import include, path
 from rest_framework import routers
 
@@ -8,10 +11,21 @@ router.register("users", UserViewSet, basename="users")
 router.register("tags", TagViewSet, basename="tags")
 router.register("recipes", RecipeViewSet, basename="recipes")
 router.register("ingredients", IngredientViewSet, basename="ingredients")
+router.register("uploads", ImageUploadViewSet, basename="uploads")
 
 
 urlpatterns = [
     path("", include(router.urls)),
     path("", include("djoser.urls")),
     path("auth/", include("djoser.urls.authtoken")),
+    path("db-pool/", DatabasePoolView.as_view()),
 ]
+
+if settings.ASYNC_VIEWS:
+    from api import async_views
+
+    urlpatterns = [
+        path("tags/", async_views.tag_list),
+        path("ingredients/", async_views.ingredient_list),
+        path("recipes/<int:pk>/", async_views.recipe_detail),
+    ] + urlpatterns
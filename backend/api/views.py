@@ -1,34 +1,63 @@
-from django.db.models import Exists, OuterRef
-from django.http import FileResponse
+import os
+import re
+from calendar import timegm
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import (BooleanField, OuterRef, Prefetch, Subquery,
+                              Value, prefetch_related_objects)
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from rest_framework import filters, status, viewsets
+from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import (AllowAny, IsAuthenticated,
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404 as get_or_404
+from rest_framework.permissions import (AllowAny, IsAdminUser,
+                                        IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from foodgram.db.pool import get_stats as get_pool_stats
+from foodgram.routers import use_primary
+from recipes.index import ingredient_index
+from recipes.services import count_of, rebuild_cart_totals
+from recipes.uploads import delete_upload, is_image, write_chunk
 from recipes.models import (Favorite, Ingredient, Recipe,
                             ShoppingCard, Tag)
+from api.cache import bump_table_versions, get_cached_response
 from api.filters import RecipeFilter
-from api.pagination import CustomPagination
+from api.pagination import CustomPagination, RecipePagination
 from api.permissions import IsAuthorOrReadOnly
-from api.serializers import (RecipeCreateSerializer, RecipeReadSerializer,
-                             ShortRecipeInfoSerializer, TagSerializer,
-                             UserSubscribeSerializer)
-from api.services import get_shopping_list
+from api.renderers import (ShoppingListCSVRenderer, ShoppingListPDFRenderer,
+                           ShoppingListTextRenderer)
+from api.serializers import (ImageUploadSerializer, IngredientSerializer,
+                             RecipeCreateSerializer, RecipeIdsSerializer,
+                             RecipeReadSerializer, ShortRecipeInfoSerializer,
+                             TagSerializer, UserSubscribeSerializer)
+from api.services import (annotate_is_subscribed, create_once,
+                          get_recipes_queryset, get_shopping_list,
+                          get_validators)
 from users.models import Follow, User
 
 
 class GetObjectMixin:
+    @transaction.atomic
     def func_to_add(self, request, pk, Model):
         user = request.user
         recipe = get_object_or_404(Recipe, id=pk)
         serializer = ShortRecipeInfoSerializer(recipe)
-        Model.objects.get_or_create(user=user, recipe=recipe)
+        create_once(Model, user=user, recipe=recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def func_to_delete(self, request, pk, Model):
         user = request.user
         recipe = get_object_or_404(Recipe, id=pk)
@@ -36,11 +65,168 @@ class GetObjectMixin:
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class BulkMixin:
+    @transaction.atomic
+    def bulk_add(self, request, Model):
+        """Добавляет рецепты одной вставкой, уже добавленные пропускает.
+
+        bulk_create не вызывает сигналы, поэтому счётчики избранного
+        и итоги корзины пересчитываются здесь.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.validated_data["recipes"]
+        user = request.user
+        Model.objects.bulk_create(
+            (Model(user=user, recipe=recipe) for recipe in recipes),
+            ignore_conflicts=True,
+        )
+        if Model is Favorite:
+            Recipe.objects.filter(id__in=[r.id for r in recipes]).update(
+                favorites_count=count_of(Favorite, "recipe")
+            )
+        else:
+            rebuild_cart_totals(User.objects.filter(id=user.id))
+        bump_table_versions(Model._meta.db_table)
+        serializer = ShortRecipeInfoSerializer(
+            recipes,
+            many=True,
+            context={"request": request},
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @transaction.atomic
+    def bulk_delete(self, request, Model):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        Model.objects.filter(
+            user=request.user,
+            recipe__in=serializer.validated_data["recipes"],
+        ).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def conditional_response(request, etag, last_modified, handler):
+    """304 по If-None-Match/If-Modified-Since или ответ handler()."""
+    if etag is None:
+        return handler()
+    if last_modified is not None:
+        last_modified = timegm(last_modified.utctimetuple())
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=last_modified,
+    )
+    if response is None:
+        response = handler()
+    if response.status_code in (200, 304):
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def reference_content(queryset, serializer_class):
+    """Справочник целиком готовыми байтами из кеша: (etag, байты).
+
+    Ответ хранится под версией таблицы, поэтому запрос не доходит
+    ни до базы, ни до сериализатора, пока таблица не изменилась.
+    Строится по основной базе: отстающая реплика сохранила бы старые
+    строки под новой версией.
+    """
+    table = queryset.model._meta.db_table
+
+    def render():
+        serializer = serializer_class(
+            queryset.using(DEFAULT_DB_ALIAS), many=True
+        )
+        return JSONRenderer().render(serializer.data)
+
+    return get_cached_response(table, [table], render)
+
+
+def reference_response(request, queryset, serializer_class):
+    etag, content = reference_content(queryset, serializer_class)
+    return conditional_response(
+        request, etag, None,
+        lambda: HttpResponse(content, content_type=JSONRenderer.media_type),
+    )
+
+
+class ConditionalGetMixin:
+    """ETag и Last-Modified для list и retrieve без сериализации ответа."""
+
+    user_dependent = False
+
+    def conditional(self, handler, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        detail = lookup in self.kwargs
+        if detail:
+            try:
+                queryset = queryset.filter(
+                    **{self.lookup_field: self.kwargs[lookup]}
+                )
+            except (TypeError, ValueError, DjangoValidationError):
+                raise Http404
+        else:
+            # ETag списка — версия таблицы, а не содержимое: тело должно
+            # быть не старее версии.
+            use_primary()
+        etag, last_modified = get_validators(
+            queryset,
+            request.get_full_path(),
+            request.user if self.user_dependent else None,
+            detail,
+        )
+        return conditional_response(
+            request, etag, last_modified,
+            lambda: handler(request, *args, **kwargs),
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+
+class ReferenceCacheMixin:
+    """Список без параметров отдаётся из кеша справочников."""
+
+    def list(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        if request.query_params or not isinstance(renderer, JSONRenderer):
+            return super().list(request, *args, **kwargs)
+        return reference_response(
+            request, self.get_queryset(), self.get_serializer_class()
+        )
+
+
 class UserViewSet(UserViewSet):
     queryset = User.objects.all()
     pagination_class = CustomPagination
     permission_classes = (AllowAny,)
 
+    def get_queryset(self):
+        return annotate_is_subscribed(
+            super().get_queryset(),
+            self.request.user
+        )
+
+    def get_recipes_prefetch(self):
+        """Не больше recipes_limit свежих рецептов на автора одним запросом."""
+        recipes = Recipe.objects.all()
+        recipes_limit = self.request.query_params.get("recipes_limit")
+        if recipes_limit is not None and recipes_limit.isdigit():
+            newest = (
+                Recipe.objects
+                .filter(author=OuterRef("author"))
+                .values("id")[:int(recipes_limit)]
+            )
+            recipes = recipes.filter(id__in=Subquery(newest))
+        return Prefetch("recipes", queryset=recipes)
+
     @action(
         detail=False,
         methods=["get"],
@@ -48,7 +234,12 @@ class UserViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         user = request.user
-        queryset = User.objects.filter(following__user=user)
+        queryset = (
+            User.objects
+            .filter(following__user=user)
+            .annotate(is_subscribed=Value(True, output_field=BooleanField()))
+            .prefetch_related(self.get_recipes_prefetch())
+        )
         page = self.paginate_queryset(queryset)
         serializer = UserSubscribeSerializer(
             page,
@@ -65,7 +256,9 @@ class UserViewSet(UserViewSet):
     def subscribe(self, request, id):
         following = get_object_or_404(User, id=id)
         user = request.user
-        Follow.objects.get_or_create(user=user, following=following)
+        create_once(Follow, user=user, following=following)
+        following.is_subscribed = True
+        prefetch_related_objects([following], self.get_recipes_prefetch())
         serializer = UserSubscribeSerializer(
             following,
             context={"request": request},
@@ -80,59 +273,68 @@ class UserViewSet(UserViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(ReferenceCacheMixin, ConditionalGetMixin,
+                 viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(ReferenceCacheMixin, ConditionalGetMixin,
+                        viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
-    serializer_class = TagSerializer
+    serializer_class = IngredientSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
     pagination_class = None
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ["name"]
 
-    def get_queryset(self):
-        queryset = self.queryset
-        name = self.request.query_params.get("name", None)
-        if name is not None:
-            queryset = queryset.filter(name__istartswith=name)
-        return queryset
+    def list(self, request, *args, **kwargs):
+        if "name" not in request.query_params:
+            return super().list(request, *args, **kwargs)
+        return self.conditional(self.search, request)
+
+    def search(self, request):
+        serializer = self.get_serializer(
+            ingredient_index.search(request.query_params["name"]),
+            many=True,
+        )
+        return Response(serializer.data)
 
 
-class RecipeViewSet(GetObjectMixin, viewsets.ModelViewSet):
+class RecipeViewSet(GetObjectMixin, BulkMixin, ConditionalGetMixin,
+                    viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     permission_classes = (IsAuthorOrReadOnly, )
-    pagination_class = CustomPagination
+    pagination_class = RecipePagination
+    user_dependent = True
 
     def get_queryset(self):
-        user = self.request.user
-        queryset = (
-            Recipe.objects
-            .select_related("author")
-            .prefetch_related("tags")
-        )
-        if user.is_authenticated:
-            favorite = Favorite.objects.filter(
-                user=user, recipe=OuterRef("id"))
-            is_in_shopping_cart = ShoppingCard.objects.filter(
-                user=user, recipe=OuterRef("id")
-            )
-            queryset = queryset.annotate(
-                is_favorited=Exists(favorite),
-                is_in_shopping_cart=Exists(is_in_shopping_cart)
-            )
-        return queryset
+        return get_recipes_queryset(self.request.user)
 
     def get_serializer_class(self):
         if self.request.method in ("POST", "PUT", "PATCH", "DELETE"):
             return RecipeCreateSerializer
         return RecipeReadSerializer
 
+    @action(
+        detail=False,
+        methods=["POST"],
+        permission_classes=[IsAuthenticated]
+    )
+    def batch(self, request):
+        if (not isinstance(request.data, list)
+                or len(request.data) > settings.MAX_RECIPES_BATCH):
+            raise ValidationError(
+                f"Ожидается список не более чем из "
+                f"{settings.MAX_RECIPES_BATCH} рецептов"
+            )
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
     @action(
         detail=True,
         methods=["POST"],
@@ -157,14 +359,116 @@ class RecipeViewSet(GetObjectMixin, viewsets.ModelViewSet):
     def shopping_cart_delete(self, request, pk):
         return self.func_to_delete(request, pk, ShoppingCard)
 
+    @action(
+        detail=False,
+        methods=["POST"],
+        url_path="favorite/bulk",
+        permission_classes=[IsAuthenticated]
+    )
+    def favorite_bulk(self, request):
+        return self.bulk_add(request, Favorite)
+
+    @favorite_bulk.mapping.delete
+    def favorite_bulk_delete(self, request):
+        return self.bulk_delete(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=["POST"],
+        url_path="shopping_cart/bulk",
+        permission_classes=[IsAuthenticated]
+    )
+    def shopping_cart_bulk(self, request):
+        return self.bulk_add(request, ShoppingCard)
+
+    @shopping_cart_bulk.mapping.delete
+    def shopping_cart_bulk_delete(self, request):
+        return self.bulk_delete(request, ShoppingCard)
+
     @action(
         detail=False,
         methods=["GET"],
-        permission_classes=[IsAuthenticated])
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[ShoppingListTextRenderer, ShoppingListCSVRenderer,
+                          ShoppingListPDFRenderer])
     def download_shopping_cart(self, request):
         user = request.user
-        return FileResponse(
-            get_shopping_list(user=user),
-            as_attachment=True,
-            filename="shop_list.txt"
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f"; charset={renderer.charset}"
+        content = renderer.stream(get_shopping_list(user=user))
+        if isinstance(request._request, ASGIRequest):
+            # Под ASGI потоковое тело перебирается прямо в цикле событий:
+            # там нельзя ходить в базу, а сборка PDF заблокировала бы
+            # воркер. Файл целиком собирается здесь, в потоке
+            # синхронного представления.
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            response = StreamingHttpResponse(
+                content, content_type=content_type
+            )
+        response["Content-Disposition"] = (
+            f'attachment; filename="shop_list.{renderer.format}"'
         )
+        return response
+
+
+CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+class ImageUploadViewSet(mixins.CreateModelMixin,
+                         mixins.RetrieveModelMixin,
+                         viewsets.GenericViewSet):
+    """Загрузка картинок рецептов.
+
+    POST с file в multipart сохраняет файл целиком. POST с name и size
+    создаёт загрузку по частям: части отправляются PUT с заголовком
+    Content-Range, GET показывает, сколько байт уже получено.
+    """
+
+    serializer_class = ImageUploadSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return self.request.user.image_uploads.all()
+
+    def update(self, request, pk=None):
+        match = CONTENT_RANGE.match(request.headers.get("Content-Range", ""))
+        if match is None:
+            raise ValidationError(
+                "Нужен заголовок Content-Range: bytes начало-конец/размер"
+            )
+        start, end, total = map(int, match.groups())
+        length = end - start + 1
+        with transaction.atomic():
+            upload = get_or_404(
+                self.get_queryset().select_for_update(), pk=pk
+            )
+            if (total != upload.size or end >= total or length < 1
+                    or int(request.META.get("CONTENT_LENGTH") or 0)
+                    != length):
+                raise ValidationError(
+                    "Content-Range не совпадает с размером загрузки или тела"
+                )
+            if start > upload.received:
+                return Response(
+                    self.get_serializer(upload).data,
+                    status=status.HTTP_409_CONFLICT,
+                )
+            written = write_chunk(upload, request.stream, start, length)
+            upload.received = start + written
+            upload.save(update_fields=["received"])
+        if upload.completed and not is_image(upload):
+            delete_upload(upload)
+            raise ValidationError("Файл не является картинкой")
+        return Response(self.get_serializer(upload).data)
+
+
+class DatabasePoolView(APIView):
+    """Заполненность пула соединений воркера, обработавшего запрос."""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response({"pid": os.getpid(), "pools": get_pool_stats()})
@@ -0,0 +1,9 @@
+from recipes.index import ingredient_index
+from api.views import IngredientViewSet, TagViewSet, reference_content
+
+
+def prime_reference_data():
+    """Заполняет кеш справочников и индекс ингредиентов воркера."""
+    for viewset in (TagViewSet, IngredientViewSet):
+        reference_content(viewset.queryset.all(), viewset.serializer_class)
+    ingredient_index.build()
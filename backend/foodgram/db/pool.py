@@ -0,0 +1,207 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Соединения, унаследованные от родителя при fork. Закрывать их в
+# дочернем процессе нельзя — это закроет сокет и родителю, — поэтому
+# ссылки просто хранятся до конца процесса.
+_inherited = []
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Пул соединений одного процесса.
+
+    Соединение возвращается в пул вместо закрытия. Перед выдачей его
+    можно проверить запросом SELECT 1 (pre_ping); простоявшие дольше
+    idle_timeout секунд соединения закрываются.
+    """
+
+    def __init__(self, connect, size, idle_timeout, pre_ping, timeout):
+        self.connect = connect
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.pre_ping = pre_ping
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self._condition = threading.Condition()
+        self._idle = deque()
+        self._in_use = 0
+        self.stats = {
+            "checkouts": 0,
+            "created": 0,
+            "discarded": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "timeouts": 0,
+            "peak_in_use": 0,
+        }
+
+    def acquire(self):
+        with self._condition:
+            self._wait_for_slot()
+            self._in_use += 1
+            self.stats["checkouts"] += 1
+            self.stats["peak_in_use"] = max(
+                self.stats["peak_in_use"], self._in_use
+            )
+            expired = self._take_expired()
+            connection = self._idle.pop()[0] if self._idle else None
+        for stale in expired:
+            self._discard(stale)
+        try:
+            if connection is not None and not self._check(connection):
+                self._discard(connection)
+                connection = None
+            if connection is None:
+                connection = self.connect()
+                with self._condition:
+                    self.stats["created"] += 1
+        except BaseException:
+            with self._condition:
+                self._in_use -= 1
+                self._condition.notify()
+            raise
+        return connection
+
+    def release(self, connection):
+        reusable = self._reset(connection)
+        with self._condition:
+            self._in_use -= 1
+            if reusable:
+                self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+        if not reusable:
+            self._discard(connection)
+
+    def close_all(self):
+        """Закрывает простаивающие соединения.
+
+        Выданные соединения не трогаются: они вернутся в пул при
+        закрытии соединения Django.
+        """
+        with self._condition:
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+        for connection in idle:
+            self._discard(connection)
+
+    def _wait_for_slot(self):
+        if self._in_use < self.size:
+            return
+        self.stats["waits"] += 1
+        logger.warning(
+            "Пул соединений заполнен (%s), запрос ждёт", self.size
+        )
+        started = time.monotonic()
+        available = self._condition.wait_for(
+            lambda: self._in_use < self.size, self.timeout
+        )
+        self.stats["wait_seconds"] += time.monotonic() - started
+        if not available:
+            self.stats["timeouts"] += 1
+            raise PoolTimeout(
+                f"Нет свободного соединения за {self.timeout} с"
+            )
+
+    def _take_expired(self):
+        if not self.idle_timeout:
+            return []
+        deadline = time.monotonic() - self.idle_timeout
+        expired = []
+        while self._idle and self._idle[0][1] < deadline:
+            expired.append(self._idle.popleft()[0])
+        return expired
+
+    def _check(self, connection):
+        if connection.closed:
+            return False
+        if not self.pre_ping:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            if not connection.autocommit:
+                connection.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _reset(self, connection):
+        """Откатывает незавершённую транзакцию перед возвратом в пул."""
+        if connection.closed:
+            return False
+        try:
+            if not connection.autocommit:
+                connection.rollback()
+            elif connection.get_transaction_status():
+                connection.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, connection):
+        with self._condition:
+            self.stats["discarded"] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def get_stats(self):
+        with self._condition:
+            return {
+                **self.stats,
+                "size": self.size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+            }
+
+
+def get_pool(key, connect, **options):
+    """Пул для key в текущем процессе.
+
+    После fork пулы родителя не используются: у воркера gunicorn
+    свои соединения.
+    """
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None and pool.pid != os.getpid():
+            _inherited.extend(
+                connection for connection, _ in pool._idle
+            )
+            pool = None
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(connect, **options)
+        return pool
+
+
+def close_all():
+    """Закрывает простаивающие соединения всех пулов процесса.
+
+    Закрытие соединения Django только возвращает его в пул; по-настоящему
+    соединения закрываются здесь — перед fork и перед удалением
+    тестовой базы.
+    """
+    pid = os.getpid()
+    with _pools_lock:
+        pools = [pool for pool in _pools.values() if pool.pid == pid]
+    for pool in pools:
+        pool.close_all()
+
+
+def get_stats():
+    """Статистика всех пулов текущего процесса."""
+    pid = os.getpid()
+    with _pools_lock:
+        pools = [pool for pool in _pools.items() if pool[1].pid == pid]
+    return {alias: pool.get_stats() for (alias, _), pool in pools}
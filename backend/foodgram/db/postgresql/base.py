@@ -0,0 +1,70 @@
+"""PostgreSQL с пулом соединений.
+
+ENGINE = "foodgram.db.postgresql". Параметры пула — в ключе POOL
+настроек базы: SIZE, IDLE_TIMEOUT, PRE_PING, TIMEOUT. Закрытие
+соединения возвращает его в пул; закрывает соединения пула
+foodgram.db.pool.close_all().
+"""
+import psycopg2.extras
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+
+from foodgram.db.pool import PoolTimeout, get_pool
+from foodgram.db.postgresql.creation import DatabaseCreation
+
+Database = base.Database
+
+POOL_DEFAULTS = {
+    "SIZE": 10,
+    "IDLE_TIMEOUT": 300,
+    "PRE_PING": True,
+    "TIMEOUT": 10,
+}
+
+
+def connect(conn_params):
+    connection = Database.connect(**conn_params)
+    psycopg2.extras.register_default_jsonb(
+        conn_or_curs=connection, loads=lambda x: x
+    )
+    return connection
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Берёт соединения из пула процесса и возвращает их туда же."""
+
+    creation_class = DatabaseCreation
+    pool = None
+
+    def get_pool(self, conn_params):
+        options = {**POOL_DEFAULTS, **self.settings_dict.get("POOL", {})}
+        return get_pool(
+            (self.alias, repr(sorted(conn_params.items()))),
+            lambda: connect(conn_params),
+            size=options["SIZE"],
+            idle_timeout=options["IDLE_TIMEOUT"],
+            pre_ping=options["PRE_PING"],
+            timeout=options["TIMEOUT"],
+        )
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        try:
+            connection = self.pool.acquire()
+        except PoolTimeout as error:
+            raise Database.OperationalError(str(error)) from error
+        options = self.settings_dict["OPTIONS"]
+        try:
+            self.isolation_level = options["isolation_level"]
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection)
@@ -0,0 +1,20 @@
+from django.db.backends.postgresql import creation
+
+from foodgram.db.pool import close_all
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    """Закрывает соединения пула перед удалением и копированием базы.
+
+    Postgres не удаляет базу и не копирует её шаблоном, пока к ней
+    подключён кто-то ещё, а закрытое соединение Django остаётся
+    открытым в пуле.
+    """
+
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        close_all()
+        super()._clone_test_db(suffix, verbosity, keepdb)
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_all()
+        super()._destroy_test_db(test_database_name, verbosity)
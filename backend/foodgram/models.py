@@ -0,0 +1,35 @@
+from django.db.models import F
+
+
+def change_counter(model, pk, field, delta):
+    """Меняет счётчик field записи pk на delta одним UPDATE.
+
+    Уменьшение не опускает счётчик ниже нуля.
+    """
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f"{field}__gte": -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+class MaintainedFieldsMixin:
+    """Не даёт обычному save() затирать поля, которые ведёт база.
+
+    Поля из maintained_fields меняются только через update() с F():
+    счётчики, версии, маски. save() уже загруженного объекта без
+    update_fields записывает все поля, кроме них, поэтому устаревший
+    экземпляр не откатит значения, обновлённые другими запросами.
+    """
+
+    maintained_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding
+                and not kwargs.get("force_insert")
+                and kwargs.get("update_fields") is None):
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.maintained_fields
+            ]
+        super().save(*args, **kwargs)
@@ -0,0 +1,100 @@
+"""Чтение с реплик базы.
+
+Реплики подключаются переменной окружения DB_REPLICA_HOSTS. Запросы
+на чтение (GET, HEAD, OPTIONS) читают с одной случайной реплики,
+выбранной на весь запрос, всё остальное — с основной базы.
+Пользователь, который что-то записал, ещё REPLICA_STICKY_SECONDS
+читает только с основной базы, чтобы сразу видеть свои изменения
+несмотря на отставание реплик.
+"""
+import hashlib
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.deprecation import MiddlewareMixin
+
+STICKY_KEY = "replica_sticky:{}"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+# Токены и сессии читаются с основной базы: иначе сразу после входа
+# реплика может ещё не знать о новом токене.
+PRIMARY_MODELS = {"authtoken.token", "sessions.session"}
+
+# Реплика, с которой читает запрос; None — основная база. Одна на
+# весь запрос, чтобы не смешивать данные реплик с разным отставанием.
+# Сбрасывается после первой записи.
+_replica = ContextVar("replica", default=None)
+_wrote = ContextVar("wrote", default=False)
+
+
+def get_replicas():
+    return [
+        alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS
+    ]
+
+
+def use_primary():
+    """Остаток запроса читает с основной базы.
+
+    Нужно ответам, которые хранятся или сравниваются под общей версией
+    таблицы: версия меняется сразу после записи в основную базу, и
+    отстающая реплика отдала бы под ней старые строки.
+    """
+    _replica.set(None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = _replica.get()
+        if (replica is None
+                or model._meta.label_lower in PRIMARY_MODELS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        _replica.set(None)
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def get_sticky_key(request):
+    """Ключ пользователя: хеш токена или сессии, без них — None."""
+    credentials = (
+        request.META.get("HTTP_AUTHORIZATION")
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if not credentials:
+        return None
+    digest = hashlib.sha256(credentials.encode()).hexdigest()
+    return STICKY_KEY.format(digest)
+
+
+class ReplicaMiddleware(MiddlewareMixin):
+    """Выбирает реплику для запроса, если он может читать с реплик."""
+
+    def process_request(self, request):
+        key = get_sticky_key(request)
+        _wrote.set(False)
+        replicas = get_replicas()
+        if (replicas and request.method in SAFE_METHODS
+                and not (key and cache.get(key))):
+            _replica.set(random.choice(replicas))
+        else:
+            _replica.set(None)
+
+    def process_response(self, request, response):
+        key = get_sticky_key(request)
+        if key and (_wrote.get() or request.method not in SAFE_METHODS):
+            cache.set(key, True, settings.REPLICA_STICKY_SECONDS)
+        _replica.set(None)
+        _wrote.set(False)
+        return response
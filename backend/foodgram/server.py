@@ -0,0 +1,105 @@
+"""Настройки gunicorn: gunicorn -c python:foodgram.server foodgram.wsgi.
+
+Число воркеров считается по доступным процессорам и памяти с учётом
+ограничений cgroup контейнера; любое значение можно задать явно
+через переменные окружения GUNICORN_*.
+"""
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+
+
+def _read(path):
+    try:
+        with open(path) as file:
+            return file.read().split()
+    except OSError:
+        return None
+
+
+def _cpu_count():
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count() or 1
+    quota = _read("/sys/fs/cgroup/cpu.max")
+    if quota is None:
+        quota = (_read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") or [])
+        quota += (_read("/sys/fs/cgroup/cpu/cpu.cfs_period_us") or [])
+    if len(quota) == 2 and quota[0] not in ("max", "-1"):
+        count = min(count, int(quota[0]) / int(quota[1]))
+    return max(1, int(count + 0.5))
+
+
+def _memory_mb():
+    limits = []
+    for path in ("/sys/fs/cgroup/memory.max",
+                 "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        value = _read(path)
+        if value and value[0].isdigit():
+            limits.append(int(value[0]) // 2 ** 20)
+    meminfo = _read("/proc/meminfo") or []
+    if "MemTotal:" in meminfo:
+        limits.append(int(meminfo[meminfo.index("MemTotal:") + 1]) // 1024)
+    return min(limits) if limits else None
+
+
+def _workers():
+    workers = _concurrency
+    memory = _memory_mb()
+    if memory is not None:
+        per_worker = int(os.getenv("GUNICORN_WORKER_MEMORY", 256))
+        workers = min(workers, memory // per_worker)
+    return max(1, workers)
+
+
+# Сколько запросов сервер обрабатывает одновременно. Если памяти на
+# все воркеры не хватает, недостающее добирается потоками.
+_concurrency = 2 * _cpu_count() + 1
+workers = int(os.getenv("GUNICORN_WORKERS", 0)) or _workers()
+if os.getenv("ASGI", "False") == "True":
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    threads = (
+        int(os.getenv("GUNICORN_THREADS", 0))
+        or -(-_concurrency // workers)
+    )
+    if threads > 1:
+        worker_class = "gthread"
+
+# Приложение импортируется один раз в мастере, воркеры получают его
+# через fork уже загруженным.
+preload_app = True
+# Воркер перезапускается после стольких запросов, чтобы не копить
+# утечки памяти; разброс не даёт всем воркерам уйти одновременно.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = max_requests // 10
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = timeout
+keepalive = 5
+accesslog = "-"
+
+
+def pre_fork(server, worker):
+    # Соединения мастера нельзя делить с воркерами: close_all() Django
+    # возвращает их в пул, а пул закрывает по-настоящему.
+    from django.db import connections
+
+    from foodgram.db import pool
+
+    connections.close_all()
+    pool.close_all()
+
+
+def post_fork(server, worker):
+    from django.db import connections
+    from gunicorn.workers.sync import SyncWorker
+
+    from foodgram.warmup import run_warmup_hooks
+
+    run_warmup_hooks()
+    if not isinstance(worker, SyncWorker):
+        # Главный поток потоковых и асинхронных воркеров запросы не
+        # обслуживает: соединения прогрева возвращаются в пул, иначе
+        # они заняты до конца жизни воркера.
+        connections.close_all()
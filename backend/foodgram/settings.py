@@ -19,6 +19,28 @@ load_dotenv(find_dotenv())
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 MAX_LENGHT = 200
+# Как часто воркер перечитывает индекс ингредиентов, секунды.
+INGREDIENT_INDEX_TTL = int(os.getenv("INGREDIENT_INDEX_TTL", 300))
+# Сколько ингредиентов отдаёт поиск по названию за один запрос.
+INGREDIENT_SEARCH_LIMIT = int(os.getenv("INGREDIENT_SEARCH_LIMIT", 50))
+# Сколько хранится закэшированное представление рецепта, секунды.
+RECIPE_CACHE_TIMEOUT = int(os.getenv("RECIPE_CACHE_TIMEOUT", 60 * 60 * 24))
+# Сколько рецептов можно создать одним запросом к /recipes/batch/.
+MAX_RECIPES_BATCH = int(os.getenv("MAX_RECIPES_BATCH", 50))
+# Сколько рецептов можно добавить в избранное или корзину одним запросом.
+MAX_BULK_RECIPES = int(os.getenv("MAX_BULK_RECIPES", 100))
+# Наибольшее значение параметра limit в списках.
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 100))
+# Сколько секунд хранить число строк для пагинации.
+COUNT_CACHE_TTL = int(os.getenv("COUNT_CACHE_TTL", 60))
+# С какого размера таблицы без фильтров брать оценку из pg_class.
+COUNT_ESTIMATE_MIN_ROWS = int(os.getenv("COUNT_ESTIMATE_MIN_ROWS", 100000))
+# Максимальный размер картинки, загружаемой через /uploads/, в байтах.
+MAX_IMAGE_UPLOAD_SIZE = int(
+    os.getenv("MAX_IMAGE_UPLOAD_SIZE", 50 * 1024 * 1024)
+)
+# Через сколько часов удалять загрузки, не привязанные к рецепту.
+IMAGE_UPLOAD_TTL = int(os.getenv("IMAGE_UPLOAD_TTL", 24))
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.2/howto/deployment/checklist/
 
@@ -30,6 +52,11 @@ print(SECRET_KEY)
 DEBUG = os.getenv("DEBUG", default="False") == "True"
 
 ALLOWED_HOSTS = os.getenv("ALLOWED_HOSTS", default=" ").split(", ")
+
+# Приложение запущено через ASGI (uvicorn): подключаются асинхронные
+# обработчики самых частых запросов на чтение из api/async_views.py.
+ASYNC_VIEWS = os.getenv("ASGI", default="False") == "True"
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -85,16 +112,82 @@ WSGI_APPLICATION = "foodgram.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Соединения с Postgres берутся из пула процесса (foodgram/db); при
+# DB_POOL=False — обычный бэкенд Django с постоянными соединениями.
+DB_POOL = os.getenv("DB_POOL", default="True") == "True"
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        "ENGINE": (
+            "foodgram.db.postgresql" if DB_POOL
+            else "django.db.backends.postgresql"
+        ),
         "NAME": os.getenv("POSTGRES_DB", "django"),
         "USER": os.getenv("POSTGRES_USER", "django"),
         "PASSWORD": os.getenv("POSTGRES_PASSWORD", ""),
         "HOST": os.getenv("DB_HOST", ""),
-        "PORT": os.getenv("DB_PORT", 5432)
+        "PORT": os.getenv("DB_PORT", 5432),
+        # Без пула соединение живёт между запросами, в том числе
+        # открытое при прогреве воркера. С пулом оно после запроса
+        # возвращается в пул и достаётся любому потоку.
+        "CONN_MAX_AGE": int(os.getenv("CONN_MAX_AGE", 0 if DB_POOL else 60)),
+        "POOL": {
+            "SIZE": int(os.getenv("DB_POOL_SIZE", 10)),
+            "IDLE_TIMEOUT": int(os.getenv("DB_POOL_IDLE_TIMEOUT", 300)),
+            "PRE_PING": os.getenv("DB_POOL_PRE_PING", "True") == "True",
+            "TIMEOUT": int(os.getenv("DB_POOL_TIMEOUT", 10)),
+        },
+    }
+}
+
+# Реплики для чтения через запятую: "host[:port],host[:port]". Имя
+# базы и пользователь — как у основной. Для локальной проверки можно
+# указать тот же хост, что и в DB_HOST. В тестах реплики смотрят
+# в тестовую основную базу (MIRROR).
+DB_REPLICA_HOSTS = [
+    host for host in os.getenv("DB_REPLICA_HOSTS", "").split(",") if host
+]
+for number, replica in enumerate(DB_REPLICA_HOSTS, start=1):
+    host, _, port = replica.partition(":")
+    DATABASES[f"replica{number}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
     }
+if DB_REPLICA_HOSTS:
+    DATABASE_ROUTERS = ["foodgram.routers.ReplicaRouter"]
+    MIDDLEWARE.insert(0, "foodgram.routers.ReplicaMiddleware")
+# Сколько секунд после записи пользователь читает с основной базы.
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", 15))
+
+# default — общий для всех воркеров кеш: memcached, если задан
+# MEMCACHED_LOCATION, иначе память процесса. Без memcached версии
+# таблиц не доходят до других воркеров, поэтому при нескольких
+# воркерах он обязателен (проверка api.W001). local — всегда память
+# процесса, ближний уровень кеша справочников.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "local": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "local",
+    },
 }
+if os.getenv("MEMCACHED_LOCATION"):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+        "LOCATION": os.getenv("MEMCACHED_LOCATION"),
+    }
+# Сколько секунд хранить готовые ответы со справочниками.
+REFERENCE_CACHE_TIMEOUT = int(os.getenv("REFERENCE_CACHE_TIMEOUT", 60 * 60))
+# Что выполняет каждый воркер gunicorn перед приёмом запросов
+# (см. foodgram/server.py).
+WARMUP_HOOKS = [
+    "foodgram.warmup.connect_databases",
+    "api.warmup.prime_reference_data",
+]
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -138,6 +231,21 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Варианты картинок рецептов, которые готовит manage.py processimages.
+RECIPE_IMAGE_FORMAT = os.getenv("RECIPE_IMAGE_FORMAT", "WEBP")
+RECIPE_IMAGE_QUALITY = int(os.getenv("RECIPE_IMAGE_QUALITY", 80))
+RECIPE_IMAGE_SIZES = {
+    "thumbnail": (160, 160),
+    "card": (640, 480),
+    "detail": (1280, 960),
+}
+
+# Шрифт с кириллицей для списка покупок в PDF.
+SHOPPING_LIST_FONT = os.getenv(
+    "SHOPPING_LIST_FONT",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,25 @@
+import logging
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def connect_databases():
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+def run_warmup_hooks():
+    """Вызывает функции из WARMUP_HOOKS.
+
+    Ошибка прогрева не мешает воркеру запуститься: первые запросы
+    просто выполнятся на холодную.
+    """
+    for path in settings.WARMUP_HOOKS:
+        try:
+            import_string(path)()
+        except Exception:
+            logger.exception("Прогрев %s не удался", path)
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
                             ShoppingCard, Tag)
+from recipes.services import rebuild_cart_totals, update_search_vector
 
 
 @admin.register(Tag)
@@ -20,9 +21,24 @@ class IngredientRecipeInline(admin.TabularInline):
 
 @admin.register(Recipe)
 class RecipesAdmin(admin.ModelAdmin):
-    list_display = ("author", "name", "text", "cooking_time")
+    list_display = ("author", "name", "text", "cooking_time",
+                    "favorites_count")
     inlines = [IngredientRecipeInline]
 
+    def save_model(self, request, obj, form, change):
+        if "image" in form.changed_data:
+            obj.image_processed = False
+        super().save_model(request, obj, form, change)
+        if change and "image" in form.changed_data:
+            # image_processed не входит в обычный save().
+            Recipe.objects.filter(pk=obj.pk).update(image_processed=False)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        update_search_vector(Recipe.objects.filter(pk=form.instance.pk))
+        if change:
+            rebuild_cart_totals(form.instance.shopping_list.values("user"))
+
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
@@ -0,0 +1,14 @@
+from django.contrib.postgres.fields import ArrayField
+
+
+class OptionalArrayField(ArrayField):
+    """ArrayField, которому не мешает другая база.
+
+    В Postgres это обычный массив. На других базах в колонку пишется
+    только NULL, а приведение %s::тип в запросе не добавляется.
+    """
+
+    def get_placeholder(self, value, compiler, connection):
+        if connection.vendor != "postgresql":
+            return "%s"
+        return super().get_placeholder(value, compiler, connection)
@@ -0,0 +1,54 @@
+import io
+import os
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+VARIANTS = ("thumbnail", "card", "detail")
+
+
+def make_variant(image_file, size):
+    """Уменьшенная копия картинки без метаданных."""
+    image_format = settings.RECIPE_IMAGE_FORMAT
+    image_file.seek(0)
+    with Image.open(image_file) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size)
+        if image_format == "JPEG" or image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(
+            buffer,
+            image_format,
+            quality=settings.RECIPE_IMAGE_QUALITY,
+            optimize=True,
+        )
+    return ContentFile(buffer.getvalue())
+
+
+def process_recipe_image(recipe):
+    """Сохраняет варианты картинки рецепта в хранилище.
+
+    Возвращает словарь {поле: имя файла} для последующего update().
+    """
+    extension = settings.RECIPE_IMAGE_FORMAT.lower()
+    names = {}
+    with recipe.image.open("rb") as image_file:
+        for variant in VARIANTS:
+            field = getattr(recipe, f"image_{variant}")
+            content = make_variant(
+                image_file, settings.RECIPE_IMAGE_SIZES[variant]
+            )
+            name = field.field.generate_filename(
+                recipe, f"{uuid4().hex}_{variant}.{extension}"
+            )
+            names[f"image_{variant}"] = field.storage.save(name, content)
+    return names
+
+
+def delete_files(storage, names):
+    for name in names:
+        if name and os.path.basename(name):
+            storage.delete(name)
@@ -0,0 +1,86 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from api.cache import get_table_versions
+from recipes.models import Ingredient
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов в памяти воркера.
+
+    Отвечает на поиск по началу названия без запросов к базе: сначала
+    идут совпадения по префиксу, затем по вхождению подстроки, всего
+    не больше INGREDIENT_SEARCH_LIMIT.
+    Перестраивается, когда меняется общая версия таблицы ингредиентов,
+    то есть после записи в любом процессе. INGREDIENT_INDEX_TTL —
+    запасной срок на случай, если общего кеша нет.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = ([], [])
+        self._version = None
+        self._built_at = None
+
+    def invalidate(self):
+        self._built_at = None
+
+    def build(self):
+        with self._lock:
+            self._build(self._current_version())
+
+    def _current_version(self):
+        return get_table_versions([Ingredient._meta.db_table])[0]
+
+    def _build(self, version):
+        items = sorted(
+            Ingredient.objects.using(DEFAULT_DB_ALIAS),
+            key=lambda ingredient: (ingredient.name.lower(), ingredient.id)
+        )
+        keys = [ingredient.name.lower() for ingredient in items]
+        self._index = (keys, items)
+        self._version = version
+        self._built_at = time.monotonic()
+
+    def _is_fresh(self, version):
+        built_at = self._built_at
+        return (
+            built_at is not None
+            and self._version == version
+            and time.monotonic() - built_at <= settings.INGREDIENT_INDEX_TTL
+        )
+
+    def _ensure_built(self):
+        version = self._current_version()
+        if self._is_fresh(version):
+            return
+        with self._lock:
+            if not self._is_fresh(version):
+                self._build(version)
+
+    def search(self, name):
+        self._ensure_built()
+        keys, items = self._index
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        name = name.lower()
+        start = bisect_left(keys, name)
+        end = start
+        while (end < len(keys) and end - start < limit
+               and keys[end].startswith(name)):
+            end += 1
+        found = items[start:end]
+        # Просмотр всех названий нужен, только если префиксных
+        # совпадений не хватило до лимита.
+        for position, key in enumerate(keys):
+            if len(found) >= limit:
+                break
+            if name in key and not start <= position < end:
+                found.append(items[position])
+        return found
+
+
+ingredient_index = IngredientIndex()
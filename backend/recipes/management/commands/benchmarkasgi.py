@@ -0,0 +1,205 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPException
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from recipes.models import CartTotal, Ingredient, Recipe
+
+MODES = {
+    "wsgi": ["foodgram.wsgi"],
+    "asgi": [
+        "--worker-class", "uvicorn.workers.UvicornWorker", "foodgram.asgi",
+    ],
+}
+
+DOWNLOAD_FORMATS = ("txt", "csv", "pdf")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def fetch(url):
+    started = time.perf_counter()
+    try:
+        with urlopen(url, timeout=30) as response:
+            response.read()
+            ok = response.status == 200
+    except (HTTPError, URLError, HTTPException, OSError):
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def download(url, token):
+    request = Request(url, headers={"Authorization": f"Token {token}"})
+    try:
+        with urlopen(request, timeout=30) as response:
+            return response.status, response.read()
+    except HTTPError as error:
+        return error.code, b""
+    except (URLError, HTTPException, OSError):
+        return None, b""
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает синхронный (WSGI) и асинхронный (ASGI) режим "
+        "на горячих запросах при одинаковом числе воркеров"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=32,
+            help="Число одновременных клиентов",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=2000,
+            help="Число запросов на каждый адрес",
+        )
+
+    def handle(self, *args, **options):
+        paths = self.get_paths()
+        cart = self.get_cart()
+        results = {}
+        failures = []
+        for mode, target in MODES.items():
+            port = free_port()
+            server = self.start_server(mode, target, port, options["workers"])
+            try:
+                self.wait_ready(server, port)
+                if cart is not None:
+                    failures += self.check_downloads(mode, port, *cart)
+                results[mode] = {
+                    path: self.load(
+                        f"http://127.0.0.1:{port}{path}",
+                        options["requests"],
+                        options["concurrency"],
+                    )
+                    for path in paths
+                }
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+        self.report(paths, results)
+        if failures:
+            raise CommandError(
+                "Выгрузка списка покупок не работает: " + ", ".join(failures)
+            )
+
+    def get_paths(self):
+        paths = ["/api/tags/"]
+        ingredient = Ingredient.objects.order_by("id").first()
+        if ingredient is not None:
+            paths.append(
+                "/api/ingredients/?name=" + quote(ingredient.name[:3])
+            )
+        recipe = Recipe.objects.order_by("id").first()
+        if recipe is not None:
+            paths.append(f"/api/recipes/{recipe.id}/")
+        return paths
+
+    def get_cart(self):
+        """Токен и первое название из непустой корзины, если она есть."""
+        total = (
+            CartTotal.objects.select_related("user", "ingredient")
+            .order_by("ingredient__name", "ingredient__measurement_unit")
+            .first()
+        )
+        if total is None:
+            self.stdout.write(
+                "Корзины пусты, выгрузка списка покупок не проверяется"
+            )
+            return None
+        token, _ = Token.objects.get_or_create(user=total.user)
+        return token.key, total.ingredient.name
+
+    def check_downloads(self, mode, port, token, name):
+        """Выгрузка корзины в каждом формате отдаёт строки корзины.
+
+        Под ASGI ошибка в потоковом ответе не меняет код 200, поэтому
+        проверяется само содержимое.
+        """
+        failures = []
+        for format in DOWNLOAD_FORMATS:
+            status, body = download(
+                f"http://127.0.0.1:{port}/api/recipes/download_shopping_cart/"
+                f"?format={format}",
+                token,
+            )
+            if format != "pdf":
+                ok = name.encode() in body
+            else:
+                ok = body.startswith(b"%PDF") and body.rstrip().endswith(
+                    b"%%EOF"
+                )
+            if status != 200 or not ok:
+                failures.append(f"{mode} {format}")
+        return failures
+
+    def start_server(self, mode, target, port, workers):
+        env = dict(os.environ, ASGI=str(mode == "asgi"))
+        return subprocess.Popen(
+            [
+                sys.executable, "-m", "gunicorn",
+                "--bind", f"127.0.0.1:{port}",
+                "--workers", str(workers),
+                "--log-level", "warning",
+                *target,
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+
+    def wait_ready(self, server, port):
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError("Сервер завершился при запуске")
+            if fetch(f"http://127.0.0.1:{port}/api/tags/")[1]:
+                return
+            time.sleep(0.2)
+        raise CommandError("Сервер не запустился за 30 секунд")
+
+    def load(self, url, count, concurrency):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            samples = list(pool.map(fetch, [url] * count))
+        elapsed = time.perf_counter() - started
+        timings = sorted(duration for duration, _ in samples)
+        return {
+            "rps": count / elapsed,
+            "p50": timings[len(timings) // 2] * 1000,
+            "p95": timings[int(len(timings) * 0.95)] * 1000,
+            "errors": sum(not ok for _, ok in samples),
+        }
+
+    def report(self, paths, results):
+        self.stdout.write(
+            f"{'адрес':40} {'режим':5} {'req/s':>8} {'p50 мс':>8} "
+            f"{'p95 мс':>8} {'ошибки':>7}"
+        )
+        for path in paths:
+            for mode in MODES:
+                stats = results[mode][path]
+                self.stdout.write(
+                    f"{path[:40]:40} {mode:5} {stats['rps']:8.1f} "
+                    f"{stats['p50']:8.1f} {stats['p95']:8.1f} "
+                    f"{stats['errors']:7}"
+                )
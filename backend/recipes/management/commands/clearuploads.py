@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from recipes.models import ImageUpload
+from recipes.uploads import delete_upload
+
+
+class Command(BaseCommand):
+    help = "Удаляет загрузки картинок, которые не привязали к рецепту"
+
+    def handle(self, *args, **options):
+        expired = ImageUpload.objects.filter(
+            created__lt=timezone.now()
+            - timedelta(hours=settings.IMAGE_UPLOAD_TTL)
+        )
+        deleted = 0
+        for upload in expired.iterator():
+            delete_upload(upload)
+            deleted += 1
+        self.stdout.write(f"Удалено загрузок: {deleted}")
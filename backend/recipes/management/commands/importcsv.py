@@ -1,21 +1,133 @@
+import csv
+import io
 import json
+import os
 
-from django.core.management.base import BaseCommand
+from api.cache import bump_table_versions
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 from recipes.models import Ingredient
 
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_json(file):
+    """Элементы JSON-массива по одному, без загрузки файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    while True:
+        chunk = file.read(JSON_CHUNK_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != "[":
+                    raise CommandError("Ожидался JSON-массив")
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise CommandError("Файл JSON оборван")
+                break
+            yield item["name"], item["measurement_unit"]
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+READERS = {"json": read_json, "csv": read_csv}
+
 
 class Command(BaseCommand):
     help = "Импорт ингредиентов"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            default=os.path.join(
+                settings.BASE_DIR, "recipes", "data", "ingredients.json"
+            ),
+        )
+        parser.add_argument("--format", choices=READERS)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
     def handle(self, *args, **options):
-        with open(
-            'recipes/data/ingredients.json',
-            'r',
-            encoding='UTF-8'
-        ) as file:
-            data = json.load(file)
+        path = options["path"]
+        file_format = options["format"] or os.path.splitext(path)[1][1:]
+        if file_format not in READERS:
+            raise CommandError("Укажите --format: json или csv")
+        self.inserted = self.skipped = 0
+        with open(path, encoding="utf-8", newline="") as file:
+            batch = {}
+            for name, measurement_unit in READERS[file_format](file):
+                key = (name.strip(), measurement_unit.strip())
+                if not key[0] or key in batch:
+                    self.skipped += 1
+                    continue
+                batch[key] = None
+                if len(batch) == options["batch_size"]:
+                    self.load(list(batch))
+                    batch = {}
+            if batch:
+                self.load(list(batch))
+        bump_table_versions(Ingredient._meta.db_table)
+        self.stdout.write(self.style.SUCCESS(
+            f"Добавлено {self.inserted}, пропущено {self.skipped}"
+        ))
+
+    @transaction.atomic
+    def load(self, rows):
+        if connection.vendor == "postgresql":
+            inserted = self.copy(rows)
+        else:
+            names = {name for name, _ in rows}
+            existing = set(
+                Ingredient.objects
+                .filter(name__in=names)
+                .values_list("name", "measurement_unit")
+            )
+            missing = [row for row in rows if row not in existing]
             Ingredient.objects.bulk_create(
-                [Ingredient(name=ingredient['name'],
-                            measurement_unit=ingredient['measurement_unit']
-                            )
-                    for ingredient in data])
+                (Ingredient(name=name, measurement_unit=measurement_unit)
+                 for name, measurement_unit in missing),
+                ignore_conflicts=True,
+            )
+            inserted = len(missing)
+        self.inserted += inserted
+        self.skipped += len(rows) - inserted
+        self.stdout.write(f"Обработано {self.inserted + self.skipped}")
+
+    def copy(self, rows):
+        """COPY во временную таблицу и вставка только новых строк."""
+        data = io.StringIO()
+        csv.writer(data).writerows(rows)
+        data.seek(0)
+        table = Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMP TABLE ingredient_staging "
+                "(name text, measurement_unit text) ON COMMIT DROP"
+            )
+            cursor.copy_expert(
+                "COPY ingredient_staging FROM STDIN WITH (FORMAT csv)", data
+            )
+            cursor.execute(
+                f"INSERT INTO {table} (name, measurement_unit, updated_at) "
+                f"SELECT name, measurement_unit, now() "
+                f"FROM ingredient_staging "
+                f"ON CONFLICT (name, measurement_unit) DO NOTHING"
+            )
+            return cursor.rowcount
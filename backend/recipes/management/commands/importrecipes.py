@@ -0,0 +1,257 @@
+import csv
+import io
+import json
+import os
+import time
+from collections import Counter
+
+from api.cache import bump_table_versions
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+from recipes.services import update_recipe_tags, update_search_vector
+from users.models import User
+
+
+class BrokenRecord(ValueError):
+    """Запись, которую не удалось прочитать; build() её пропускает."""
+
+
+def read_jsonl(file):
+    for number, line in enumerate(file, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as error:
+                yield BrokenRecord(f"строка {number}: {error}")
+
+
+def read_csv(file):
+    """Теги через «;», ингредиенты как «название|единица|количество;...»."""
+    for row in csv.DictReader(file):
+        row["tags"] = [slug for slug in row["tags"].split(";") if slug]
+        row["ingredients"] = [
+            dict(zip(("name", "measurement_unit", "amount"),
+                     line.split("|")))
+            for line in row["ingredients"].split(";") if line
+        ]
+        yield row
+
+
+READERS = {"jsonl": read_jsonl, "csv": read_csv}
+
+
+class Command(BaseCommand):
+    help = "Импорт рецептов из выгрузки в JSON lines или CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=READERS)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--checkpoint",
+            help="Файл с числом обработанных записей, "
+                 "по умолчанию <path>.checkpoint",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Продолжить с записи из файла контрольной точки",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or os.path.splitext(path)[1][1:]
+        if file_format not in READERS:
+            raise CommandError("Укажите --format: jsonl или csv")
+        checkpoint = options["checkpoint"] or f"{path}.checkpoint"
+        processed = 0
+        if options["resume"] and os.path.exists(checkpoint):
+            processed = self.load_checkpoint(checkpoint)
+            self.stdout.write(f"Продолжаем с записи {processed}")
+
+        self.tags = dict(Tag.objects.values_list("slug", "id"))
+        self.ingredients = {
+            (name, measurement_unit): pk
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                "id", "name", "measurement_unit"
+            )
+        }
+        self.authors = {}
+        self.imported = self.skipped = 0
+        started = time.monotonic()
+
+        with open(path, encoding="utf-8", newline="") as file:
+            records = READERS[file_format](file)
+            for _ in range(processed):
+                next(records, None)
+            batch = []
+            for record in records:
+                batch.append(record)
+                if len(batch) == options["batch_size"]:
+                    processed = self.import_batch(batch, processed, checkpoint)
+                    self.report(processed, started)
+                    batch = []
+            if batch:
+                processed = self.import_batch(batch, processed, checkpoint)
+                self.report(processed, started)
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово: импортировано {self.imported}, "
+            f"пропущено {self.skipped}"
+        ))
+
+    def report(self, processed, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"Обработано {processed} записей, "
+            f"{self.imported / elapsed:.0f} рецептов/с"
+        )
+
+    def load_checkpoint(self, path):
+        """Число записей, которые уже есть в базе.
+
+        Контрольная точка пишется внутри транзакции пачки вместе с id
+        последнего рецепта. Если такого рецепта нет, транзакция
+        откатилась, и пачка импортируется заново.
+        """
+        with open(path) as file:
+            state = json.load(file)
+        if isinstance(state, int):
+            # Контрольная точка прежнего формата — просто число.
+            return state
+        recipe_id = state["last_recipe_id"]
+        if (recipe_id is not None
+                and not Recipe.objects.filter(pk=recipe_id).exists()):
+            return state["previous"]
+        return state["processed"]
+
+    def save_checkpoint(self, path, processed, previous, last_recipe_id):
+        with open(f"{path}.tmp", "w") as file:
+            json.dump({
+                "processed": processed,
+                "previous": previous,
+                "last_recipe_id": last_recipe_id,
+            }, file)
+        os.replace(f"{path}.tmp", path)
+
+    def resolve_authors(self, batch):
+        emails = {
+            record.get("author") for record in batch
+            if isinstance(record, dict)
+            and isinstance(record.get("author"), str)
+        } - self.authors.keys()
+        self.authors.update(
+            User.objects.filter(email__in=emails).values_list("email", "id")
+        )
+
+    def build(self, record):
+        """Рецепт и его связи из записи или None, если запись битая."""
+        if not isinstance(record, dict):
+            self.stderr.write(f"Пропущена запись: {record}")
+            return None
+        try:
+            author = self.authors[record["author"]]
+            name = record["name"]
+            if not isinstance(name, str) or not name:
+                raise ValueError("нет названия")
+            tags = {self.tags[slug] for slug in record["tags"]}
+            ingredients = Counter()
+            for line in record["ingredients"]:
+                key = (line["name"], line["measurement_unit"])
+                ingredients[self.ingredients[key]] += int(line["amount"])
+            cooking_time = int(record["cooking_time"])
+        except (KeyError, TypeError, ValueError) as error:
+            self.stderr.write(
+                f"Пропущен рецепт {record.get('name')}: {error!r}"
+            )
+            return None
+        if cooking_time < 1 or min(ingredients.values(), default=1) < 1:
+            self.stderr.write(
+                f"Пропущен рецепт {name}: время и количество должны быть "
+                f"больше нуля"
+            )
+            return None
+        recipe = Recipe(
+            author_id=author,
+            name=name,
+            text=record.get("text", ""),
+            image=record.get("image", ""),
+            cooking_time=cooking_time,
+        )
+        return recipe, tags, ingredients
+
+    def import_batch(self, batch, processed, checkpoint):
+        self.resolve_authors(batch)
+        built = [item for item in map(self.build, batch) if item is not None]
+        self.skipped += len(batch) - len(built)
+        with transaction.atomic():
+            recipes = [recipe for recipe, _, _ in built]
+            if connection.features.can_return_rows_from_bulk_insert:
+                Recipe.objects.bulk_create(recipes)
+                self.increase_recipes_count(recipes)
+            else:
+                # Без RETURNING сохраняем по одному, счётчики обновят сигналы.
+                for recipe in recipes:
+                    recipe.save()
+            ingredient_rows = [
+                (recipe.id, ingredient, amount)
+                for recipe, _, ingredients in built
+                for ingredient, amount in ingredients.items()
+            ]
+            tag_rows = [
+                (recipe.id, tag)
+                for recipe, tags, _ in built
+                for tag in tags
+            ]
+            self.insert(
+                IngredientRecipe,
+                ("recipe_id", "ingredient_id", "amount"),
+                ingredient_rows,
+            )
+            self.insert(Recipe.tags.through, ("recipe_id", "tag_id"), tag_rows)
+            imported = Recipe.objects.filter(
+                pk__in=[recipe.id for recipe in recipes]
+            )
+            update_recipe_tags(imported)
+            update_search_vector(imported)
+            self.save_checkpoint(
+                checkpoint,
+                processed + len(batch),
+                processed,
+                recipes[-1].id if recipes else None,
+            )
+        # bulk_create и COPY не вызывают сигналы, сбрасываем кеш счётчиков.
+        bump_table_versions(
+            Recipe._meta.db_table,
+            IngredientRecipe._meta.db_table,
+            Recipe.tags.through._meta.db_table,
+        )
+        self.imported += len(built)
+        return processed + len(batch)
+
+    def increase_recipes_count(self, recipes):
+        authors = Counter(recipe.author_id for recipe in recipes)
+        for author, count in authors.items():
+            User.objects.filter(id=author).update(
+                recipes_count=F("recipes_count") + count
+            )
+
+    def insert(self, model, columns, rows):
+        """COPY на Postgres, bulk_create на остальных базах."""
+        if not rows:
+            return
+        if connection.vendor == "postgresql":
+            data = io.StringIO(
+                "".join("\t".join(map(str, row)) + "\n" for row in rows)
+            )
+            with connection.cursor() as cursor:
+                cursor.copy_from(data, model._meta.db_table, columns=columns)
+            return
+        model.objects.bulk_create(
+            (model(**dict(zip(columns, row))) for row in rows),
+            batch_size=1000,
+        )
@@ -0,0 +1,104 @@
+import time
+from datetime import timedelta
+
+from api.cache import bump_table_versions
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from recipes.images import VARIANTS, delete_files, process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Фоновая обработка картинок рецептов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Обработать очередь один раз и выйти",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2,
+            help="Пауза между проверками очереди, секунды",
+        )
+        parser.add_argument(
+            "--claim-timeout",
+            type=float,
+            default=600,
+            help="Через сколько секунд картинку, которую взял и не "
+                 "обработал другой процесс, можно взять снова",
+        )
+
+    def handle(self, *args, **options):
+        self.claim_timeout = timedelta(seconds=options["claim_timeout"])
+        while True:
+            processed = 0
+            while self.process_next():
+                processed += 1
+            if processed:
+                self.stdout.write(f"Обработано картинок: {processed}")
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
+
+    @transaction.atomic
+    def claim_next(self):
+        """Отмечает следующую картинку очереди как взятую в обработку.
+
+        Блокировка строки держится только до отметки: сама обработка
+        идёт вне транзакции.
+        """
+        now = timezone.now()
+        recipe = (
+            Recipe.objects
+            .select_for_update(skip_locked=True)
+            .filter(image_processed=False)
+            .filter(
+                Q(image_claimed_at__isnull=True)
+                | Q(image_claimed_at__lt=now - self.claim_timeout)
+            )
+            .exclude(image="")
+            .order_by("id")
+            .first()
+        )
+        if recipe is not None:
+            Recipe.objects.filter(pk=recipe.pk).update(image_claimed_at=now)
+            recipe.image_claimed_at = now
+        return recipe
+
+    def process_next(self):
+        recipe = self.claim_next()
+        if recipe is None:
+            return False
+        old_names = [
+            getattr(recipe, f"image_{variant}").name for variant in VARIANTS
+        ]
+        try:
+            names = process_recipe_image(recipe)
+        except (OSError, ValueError) as error:
+            self.stderr.write(f"Рецепт {recipe.id}: {error}")
+            names = {}
+        claimed = Recipe.objects.filter(
+            pk=recipe.pk, image_claimed_at=recipe.image_claimed_at
+        )
+        updated = claimed.filter(image=recipe.image.name).update(
+            image_processed=True,
+            image_claimed_at=None,
+            version=F("version") + 1,
+            updated_at=timezone.now(),
+            **names
+        )
+        if not updated:
+            # Картинку заменили, пока она обрабатывалась: новую
+            # обработает следующий проход.
+            claimed.update(image_claimed_at=None)
+            delete_files(recipe.image.storage, names.values())
+            return True
+        bump_table_versions(Recipe._meta.db_table)
+        if names:
+            delete_files(recipe.image.storage, old_names)
+        return True
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import Favorite, Recipe
+from recipes.services import count_of, rebuild_cart_totals
+from users.models import Follow, User
+
+COUNTERS = (
+    (User, "recipes_count", Recipe, "author"),
+    (User, "followers_count", Follow, "following"),
+    (Recipe, "favorites_count", Favorite, "recipe"),
+)
+
+
+class Command(BaseCommand):
+    help = ("Пересчёт счётчиков рецептов, избранного, подписчиков "
+            "и итогов списков покупок")
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        for model, field, related_model, related_field in COUNTERS:
+            actual = count_of(related_model, related_field)
+            fixed = (
+                model.objects
+                .exclude(**{field: actual})
+                .update(**{field: actual})
+            )
+            self.stdout.write(
+                f"{model._meta.model_name}.{field}: исправлено {fixed}"
+            )
+        rebuild_cart_totals(User.objects.all())
+        self.stdout.write("Итоги списков покупок пересчитаны")
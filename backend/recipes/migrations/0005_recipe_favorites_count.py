@@ -0,0 +1,41 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:03
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    return Coalesce(Subquery(
+        model.objects
+        .filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model("users", "User")
+    Recipe = apps.get_model("recipes", "Recipe")
+    Favorite = apps.get_model("recipes", "Favorite")
+    User.objects.update(recipes_count=count_of(Recipe, "author"))
+    Recipe.objects.update(favorites_count=count_of(Favorite, "recipe"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_counters'),
+        ('recipes', '0004_auto_20261018_0702'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def fill_cart_totals(apps, schema_editor):
+    CartTotal = apps.get_model("recipes", "CartTotal")
+    IngredientRecipe = apps.get_model("recipes", "IngredientRecipe")
+    lines = (
+        IngredientRecipe.objects
+        .filter(recipe__shopping_list__isnull=False)
+        .values("recipe__shopping_list__user", "ingredient")
+        .annotate(amount=Sum("amount"))
+        .order_by()
+    )
+    CartTotal.objects.bulk_create(
+        CartTotal(user_id=line["recipe__shopping_list__user"],
+                  ingredient_id=line["ingredient"],
+                  amount=line["amount"])
+        for line in lines
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0007_recipe_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(default=0, verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_totals', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Итог списка покупок',
+                'verbose_name_plural': 'Итоги списков покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='carttotal',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_cart_total'),
+        ),
+        migrations.RunPython(fill_cart_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:11
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model("recipes", "Ingredient")
+    IngredientRecipe = apps.get_model("recipes", "IngredientRecipe")
+    CartTotal = apps.get_model("recipes", "CartTotal")
+    duplicates = (
+        Ingredient.objects
+        .values("name", "measurement_unit")
+        .annotate(keep=Min("id"), total=Count("id"))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for duplicate in duplicates:
+        keep = duplicate["keep"]
+        group = Ingredient.objects.filter(
+            name=duplicate["name"],
+            measurement_unit=duplicate["measurement_unit"],
+        )
+        others = list(group.exclude(id=keep).values_list("id", flat=True))
+        IngredientRecipe.objects.filter(ingredient_id__in=others).update(
+            ingredient_id=keep
+        )
+        CartTotal.objects.filter(ingredient_id__in=others + [keep]).delete()
+        CartTotal.objects.bulk_create(
+            CartTotal(user_id=line["recipe__shopping_list__user"],
+                      ingredient_id=keep,
+                      amount=line["amount"])
+            for line in (
+                IngredientRecipe.objects
+                .filter(ingredient_id=keep,
+                        recipe__shopping_list__isnull=False)
+                .values("recipe__shopping_list__user")
+                .annotate(amount=Sum("amount"))
+                .order_by()
+            )
+        )
+        Ingredient.objects.filter(id__in=others).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_carttotal'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_unique_ingredient'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_card',
+            field=models.ImageField(blank=True, editable=False, upload_to='recipes/images/variants/', verbose_name='Картинка для карточки'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_detail',
+            field=models.ImageField(blank=True, editable=False, upload_to='recipes/images/variants/', verbose_name='Картинка для страницы рецепта'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_processed',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Картинка обработана'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='recipes/images/variants/', verbose_name='Миниатюра'),
+        ),
+    ]
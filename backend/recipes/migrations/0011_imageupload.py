@@ -0,0 +1,32 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0010_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file', models.FileField(upload_to='recipes/images/uploads/', verbose_name='Файл')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Размер')),
+                ('received', models.PositiveBigIntegerField(default=0, verbose_name='Получено байт')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_uploads', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Загрузка картинки',
+                'verbose_name_plural': 'Загрузки картинок',
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:19
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def fill_tags_mask(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    masks = defaultdict(int)
+    links = Recipe.tags.through.objects.filter(tag_id__lte=62)
+    for recipe_id, tag_id in links.values_list("recipe_id", "tag_id"):
+        masks[recipe_id] |= 1 << tag_id
+    Recipe.objects.bulk_update(
+        [Recipe(id=pk, tags_mask=mask) for pk, mask in masks.items()],
+        ["tags_mask"],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Маска тегов'),
+        ),
+        migrations.RunPython(fill_tags_mask, migrations.RunPython.noop),
+    ]
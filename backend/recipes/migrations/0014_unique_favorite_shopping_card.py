@@ -0,0 +1,69 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:20
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def delete_duplicates(model, *fields):
+    keep = (
+        model.objects
+        .values(*fields)
+        .annotate(keep=Min("id"))
+        .order_by()
+        .values("keep")
+    )
+    model.objects.exclude(id__in=keep).delete()
+
+
+def dedupe_favorites_and_carts(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    Favorite = apps.get_model("recipes", "Favorite")
+    ShoppingCard = apps.get_model("recipes", "ShoppingCard")
+    CartTotal = apps.get_model("recipes", "CartTotal")
+    IngredientRecipe = apps.get_model("recipes", "IngredientRecipe")
+    delete_duplicates(Favorite, "user", "recipe")
+    delete_duplicates(ShoppingCard, "user", "recipe")
+    Recipe.objects.update(favorites_count=Coalesce(Subquery(
+        Favorite.objects
+        .filter(recipe=OuterRef("pk"))
+        .order_by()
+        .values("recipe")
+        .annotate(total=Count("pk"))
+        .values("total")
+    ), 0))
+    CartTotal.objects.all().delete()
+    lines = (
+        IngredientRecipe.objects
+        .filter(recipe__shopping_list__isnull=False)
+        .values("recipe__shopping_list__user", "ingredient")
+        .annotate(amount=Sum("amount"))
+        .order_by()
+    )
+    CartTotal.objects.bulk_create(
+        CartTotal(user_id=line["recipe__shopping_list__user"],
+                  ingredient_id=line["ingredient"],
+                  amount=line["amount"])
+        for line in lines
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_tags_mask'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            dedupe_favorites_and_carts, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcard',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shopping_card'),
+        ),
+    ]
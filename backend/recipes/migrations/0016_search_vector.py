@@ -0,0 +1,49 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:36
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+CREATE_INDEX = """
+CREATE INDEX recipe_search_vector_idx
+ON recipes_recipe USING gin (search_vector)
+"""
+
+FILL_SEARCH_VECTOR = """
+UPDATE recipes_recipe AS recipe SET search_vector =
+    setweight(to_tsvector('russian', coalesce(recipe.name, '')), 'A')
+    || setweight(to_tsvector('russian', coalesce((
+        SELECT string_agg(ingredient.name, ' ')
+        FROM recipes_ingredientrecipe AS line
+        JOIN recipes_ingredient AS ingredient
+            ON ingredient.id = line.ingredient_id
+        WHERE line.recipe_id = recipe.id
+    ), '')), 'B')
+    || setweight(to_tsvector('russian', coalesce(recipe.text, '')), 'C')
+"""
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_INDEX)
+        schema_editor.execute(FILL_SEARCH_VECTOR)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS recipe_search_vector_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
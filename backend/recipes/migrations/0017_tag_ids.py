@@ -0,0 +1,60 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:50
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+import recipes.fields
+
+CREATE_INDEX = """
+CREATE INDEX recipe_tag_ids_idx ON recipes_recipe USING gin (tag_ids)
+"""
+
+FILL_TAG_IDS = """
+UPDATE recipes_recipe AS recipe SET tag_ids = (
+    SELECT array_agg(link.tag_id ORDER BY link.tag_id)
+    FROM recipes_recipe_tags AS link
+    WHERE link.recipe_id = recipe.id
+)
+"""
+
+
+def fill_tag_ids(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_INDEX)
+        schema_editor.execute(FILL_TAG_IDS)
+
+
+def fill_tags_mask(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS recipe_tag_ids_idx")
+    Recipe = apps.get_model("recipes", "Recipe")
+    masks = defaultdict(int)
+    links = Recipe.tags.through.objects.filter(tag_id__lte=62)
+    for recipe_id, tag_id in links.values_list("recipe_id", "tag_id"):
+        masks[recipe_id] |= 1 << tag_id
+    Recipe.objects.bulk_update(
+        [Recipe(id=pk, tags_mask=mask) for pk, mask in masks.items()],
+        ["tags_mask"],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_ids',
+            field=recipes.fields.OptionalArrayField(base_field=models.BigIntegerField(), editable=False, null=True, size=None, verbose_name='Теги рецепта'),
+        ),
+        migrations.RunPython(fill_tag_ids, fill_tags_mask),
+        migrations.RemoveField(
+            model_name='recipe',
+            name='tags_mask',
+        ),
+    ]
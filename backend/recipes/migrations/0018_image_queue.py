@@ -0,0 +1,22 @@
+# Generated by Django 3.2.3 on 2026-10-18 05:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_tag_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_claimed_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Картинку обрабатывают с'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('image_processed', False)), fields=['id'], name='recipe_image_queue_idx'),
+        ),
+    ]
@@ -1,7 +1,12 @@
+import uuid
+
 from colorfield.fields import ColorField
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
+from foodgram.models import MaintainedFieldsMixin
 from foodgram.settings import MAX_LENGHT
+from recipes.fields import OptionalArrayField
 from users.models import User
 
 
@@ -24,6 +29,11 @@ class Tag(models.Model):
         unique=True,
         blank=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name="Изменён",
+        auto_now=True,
+        db_index=True,
+    )
 
     def __str__(self):
         return self.name
@@ -44,6 +54,11 @@ class Ingredient(models.Model):
         verbose_name="Еденица измерения",
         blank=True,
     )
+    updated_at = models.DateTimeField(
+        verbose_name="Изменён",
+        auto_now=True,
+        db_index=True,
+    )
 
     def __str__(self):
         return f"{self.name}, {self.measurement_unit}."
@@ -51,9 +66,15 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = "Ингредиент"
         verbose_name_plural = "Ингредиенты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "measurement_unit"],
+                name="unique_ingredient",
+            ),
+        ]
 
 
-class Recipe(models.Model):
+class Recipe(MaintainedFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -71,6 +92,34 @@ class Recipe(models.Model):
         verbose_name="Картинка",
         blank=True,
     )
+    image_thumbnail = models.ImageField(
+        upload_to="recipes/images/variants/",
+        verbose_name="Миниатюра",
+        blank=True,
+        editable=False,
+    )
+    image_card = models.ImageField(
+        upload_to="recipes/images/variants/",
+        verbose_name="Картинка для карточки",
+        blank=True,
+        editable=False,
+    )
+    image_detail = models.ImageField(
+        upload_to="recipes/images/variants/",
+        verbose_name="Картинка для страницы рецепта",
+        blank=True,
+        editable=False,
+    )
+    image_processed = models.BooleanField(
+        verbose_name="Картинка обработана",
+        default=False,
+        editable=False,
+    )
+    image_claimed_at = models.DateTimeField(
+        verbose_name="Картинку обрабатывают с",
+        null=True,
+        editable=False,
+    )
     text = models.TextField(
         verbose_name="Описание",
         blank=True,
@@ -98,6 +147,42 @@ class Recipe(models.Model):
         ],
         blank=True,
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name="В избранном",
+        default=0,
+        editable=False,
+    )
+    version = models.PositiveIntegerField(
+        verbose_name="Версия",
+        default=0,
+        editable=False,
+    )
+    # id тегов рецепта для фильтра по пересечению (&&) с GIN-индексом.
+    # Заполняется только в Postgres, GIN-индекс создаёт миграция 0017.
+    tag_ids = OptionalArrayField(
+        models.BigIntegerField(),
+        verbose_name="Теги рецепта",
+        null=True,
+        editable=False,
+    )
+    updated_at = models.DateTimeField(
+        verbose_name="Изменён",
+        auto_now=True,
+        db_index=True,
+    )
+    # Заполняется только в Postgres, GIN-индекс создаёт миграция 0016.
+    search_vector = SearchVectorField(
+        verbose_name="Поисковый вектор",
+        null=True,
+        editable=False,
+    )
+
+    # Пишутся сигналами, processimages и services через update().
+    maintained_fields = (
+        "favorites_count", "version", "tag_ids", "search_vector",
+        "image_thumbnail", "image_card", "image_detail", "image_processed",
+        "image_claimed_at",
+    )
 
     def __str__(self):
         return self.name
@@ -105,7 +190,23 @@ class Recipe(models.Model):
     class Meta:
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(
+                fields=["-pub_date", "-id"],
+                name="recipe_pub_date_id_idx",
+            ),
+            models.Index(
+                fields=["author", "-pub_date"],
+                name="recipe_author_pub_date_idx",
+            ),
+            # Очередь processimages: только необработанные картинки.
+            models.Index(
+                fields=["id"],
+                condition=models.Q(image_processed=False),
+                name="recipe_image_queue_idx",
+            ),
+        ]
 
 
 class IngredientRecipe(models.Model):
@@ -154,6 +255,12 @@ class Favorite(models.Model):
     class Meta:
         verbose_name = "Избранное"
         verbose_name_plural = "Избранное"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"],
+                name="unique_favorite",
+            ),
+        ]
 
 
 class ShoppingCard(models.Model):
@@ -176,3 +283,82 @@ class ShoppingCard(models.Model):
     class Meta:
         verbose_name = "Список покупок"
         verbose_name_plural = "Список покупок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"],
+                name="unique_shopping_card",
+            ),
+        ]
+
+
+class CartTotal(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+        related_name="cart_totals"
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name="Ингредиент",
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name="Количество",
+        default=0,
+    )
+
+    def __str__(self):
+        return f"{self.user} - {self.ingredient.name}"
+
+    class Meta:
+        verbose_name = "Итог списка покупок"
+        verbose_name_plural = "Итоги списков покупок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "ingredient"],
+                name="unique_cart_total",
+            ),
+        ]
+
+
+class ImageUpload(models.Model):
+    """Картинка, загруженная отдельно от рецепта (в том числе по частям)."""
+
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False,
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+        related_name="image_uploads"
+    )
+    file = models.FileField(
+        upload_to="recipes/images/uploads/",
+        verbose_name="Файл",
+    )
+    size = models.PositiveBigIntegerField(
+        verbose_name="Размер",
+    )
+    received = models.PositiveBigIntegerField(
+        verbose_name="Получено байт",
+        default=0,
+    )
+    created = models.DateTimeField(
+        verbose_name="Создана",
+        auto_now_add=True,
+    )
+
+    @property
+    def completed(self):
+        return self.received >= self.size
+
+    def __str__(self):
+        return f"{self.user} - {self.file.name}"
+
+    class Meta:
+        verbose_name = "Загрузка картинки"
+        verbose_name_plural = "Загрузки картинок"
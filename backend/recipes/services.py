@@ -0,0 +1,168 @@
+from django.contrib.postgres.aggregates import ArrayAgg, StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from api.cache import bump_table_versions
+from recipes.models import CartTotal, IngredientRecipe, Recipe
+from users.models import User
+
+# Конфигурация полнотекстового поиска Postgres со стеммингом русского.
+SEARCH_CONFIG = "russian"
+
+
+def bump_recipe_version(recipes):
+    """Сдвигает версию и время изменения рецептов.
+
+    Сбрасывает закэшированный вид рецептов и их ETag.
+    """
+    recipes.update(version=F("version") + 1, updated_at=timezone.now())
+    bump_table_versions(Recipe._meta.db_table)
+
+
+def count_of(model, field):
+    """Число строк model, ссылающихся через field на текущую запись."""
+    return Coalesce(Subquery(
+        model.objects
+        .filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    ), 0)
+
+
+def get_tag_ids():
+    """Отсортированные id тегов рецепта одним массивом."""
+    return Subquery(
+        Recipe.tags.through.objects
+        .filter(recipe=OuterRef("pk"))
+        .order_by()
+        .values("recipe")
+        .annotate(ids=ArrayAgg("tag_id", ordering="tag_id"))
+        .values("ids")
+    )
+
+
+def update_recipe_tags(recipes):
+    """Пересчитывает tag_ids рецептов (в Postgres) и сдвигает версию."""
+    changes = {"version": F("version") + 1, "updated_at": timezone.now()}
+    if connection.vendor == "postgresql":
+        changes["tag_ids"] = get_tag_ids()
+    recipes.update(**changes)
+    bump_table_versions(Recipe._meta.db_table)
+
+
+def get_search_vector():
+    """Вектор рецепта: название, названия ингредиентов, описание."""
+    ingredient_names = (
+        IngredientRecipe.objects
+        .filter(recipe=OuterRef("pk"))
+        .order_by()
+        .values("recipe")
+        .annotate(names=StringAgg("ingredient__name", " "))
+        .values("names")
+    )
+    return (
+        SearchVector("name", weight="A", config=SEARCH_CONFIG)
+        + SearchVector(
+            Subquery(ingredient_names), weight="B", config=SEARCH_CONFIG
+        )
+        + SearchVector("text", weight="C", config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vector(recipes):
+    """Пересчитывает search_vector рецептов; вне Postgres ничего не делает."""
+    if connection.vendor == "postgresql":
+        recipes.update(search_vector=get_search_vector())
+
+
+def lock_cart_totals(users):
+    """Блокирует итоги корзин users до конца транзакции.
+
+    Блокируются строки пользователей (FOR NO KEY UPDATE): такая
+    блокировка не мешает вставке строк со ссылкой на пользователя, но
+    изменения итогов одного пользователя идут по очереди.
+    """
+    list(
+        User.objects
+        .select_for_update(no_key=True)
+        .filter(pk__in=users)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+
+
+@transaction.atomic
+def change_cart_totals(user_id, recipe_id, sign):
+    """Прибавляет (sign=1) или вычитает (sign=-1) рецепт из итогов корзины.
+
+    Недостающие строки итогов вставляются с ignore_conflicts, поэтому
+    одновременное добавление рецептов с общим ингредиентом не падает
+    на уникальном индексе, а суммы меняются через F(). Вызывается из
+    сигналов, в том числе вне транзакции, поэтому открывает свою.
+    """
+    lock_cart_totals([user_id])
+    amounts = dict(
+        IngredientRecipe.objects
+        .filter(recipe_id=recipe_id)
+        .values_list("ingredient_id")
+        .annotate(amount=Sum("amount"))
+        .order_by()
+    )
+    if not amounts:
+        return
+    if sign > 0:
+        CartTotal.objects.bulk_create(
+            (
+                CartTotal(user_id=user_id, ingredient_id=ingredient_id)
+                for ingredient_id in amounts
+            ),
+            ignore_conflicts=True,
+        )
+    totals = (
+        CartTotal.objects
+        .select_for_update()
+        .filter(user_id=user_id, ingredient_id__in=amounts)
+    )
+    changed = []
+    for total in totals:
+        delta = sign * amounts[total.ingredient_id]
+        total.amount = Greatest(F("amount") + delta, 0)
+        changed.append(total)
+    CartTotal.objects.bulk_update(changed, ["amount"])
+    if sign < 0:
+        CartTotal.objects.filter(user_id=user_id, amount=0).delete()
+
+
+@transaction.atomic
+def rebuild_cart_totals(users, ingredient_ids=None):
+    """Пересчитывает итоги корзин users заново по содержимому корзин.
+
+    Под той же блокировкой, что и change_cart_totals: иначе
+    одновременное добавление в корзину вставило бы строку между
+    удалением и вставкой итогов или потеряло бы свою разницу.
+    """
+    lock_cart_totals(users)
+    totals = CartTotal.objects.filter(user__in=users)
+    lines = IngredientRecipe.objects.filter(
+        recipe__shopping_list__user__in=users
+    )
+    if ingredient_ids is not None:
+        totals = totals.filter(ingredient_id__in=ingredient_ids)
+        lines = lines.filter(ingredient_id__in=ingredient_ids)
+    totals.delete()
+    CartTotal.objects.bulk_create(
+        CartTotal(user_id=line["recipe__shopping_list__user"],
+                  ingredient_id=line["ingredient"],
+                  amount=line["amount"])
+        for line in (
+            lines
+            .values("recipe__shopping_list__user", "ingredient")
+            .annotate(amount=Sum("amount"))
+            .order_by()
+        )
+    )
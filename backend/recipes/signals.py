@@ -0,0 +1,134 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from foodgram.models import change_counter
+from recipes.index import ingredient_index
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCard, Tag
+from recipes.services import (bump_recipe_version, change_cart_totals,
+                              update_recipe_tags, update_search_vector)
+from users.models import User
+
+
+# Поля автора, которые входят в ответ с рецептом.
+AUTHOR_FIELDS = {"email", "username", "first_name", "last_name"}
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Recipe)
+def increase_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, "recipes_count", 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrease_recipes_count(sender, instance, **kwargs):
+    change_counter(User, instance.author_id, "recipes_count", -1)
+
+
+@receiver(post_save, sender=Favorite)
+def increase_favorites_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, "favorites_count", 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def decrease_favorites_count(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, "favorites_count", -1)
+
+
+@receiver(post_save, sender=Recipe)
+def bump_saved_recipe_version(sender, instance, created, **kwargs):
+    if not created:
+        bump_recipe_version(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=User)
+def bump_author_recipes_version(sender, instance, created, update_fields,
+                                **kwargs):
+    if created:
+        return
+    if update_fields is not None and not AUTHOR_FIELDS & set(update_fields):
+        return
+    bump_recipe_version(Recipe.objects.filter(author=instance))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def retag_recipes(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        instance.cleared_recipes = list(
+            Recipe.objects.filter(tags=instance).values_list("pk", flat=True)
+        )
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        recipes = Recipe.objects.filter(pk=instance.pk)
+    elif action == "post_clear":
+        recipes = Recipe.objects.filter(pk__in=instance.cleared_recipes)
+    else:
+        recipes = Recipe.objects.filter(pk__in=pk_set)
+    update_recipe_tags(recipes)
+
+
+@receiver(post_save, sender=Tag)
+def bump_tagged_recipes_version(sender, instance, created, **kwargs):
+    if not created:
+        bump_recipe_version(Recipe.objects.filter(tags=instance))
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tagged_recipes(sender, instance, **kwargs):
+    instance.cleared_recipes = list(
+        Recipe.objects.filter(tags=instance).values_list("pk", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Tag)
+def untag_recipes(sender, instance, **kwargs):
+    update_recipe_tags(Recipe.objects.filter(pk__in=instance.cleared_recipes))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def bump_ingredient_recipes_version(sender, instance, created=False,
+                                    **kwargs):
+    if not created:
+        bump_recipe_version(Recipe.objects.filter(ingredients=instance))
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vector(Recipe.objects.filter(ingredients=instance))
+
+
+@receiver(pre_delete, sender=Ingredient)
+def remember_ingredient_recipes(sender, instance, **kwargs):
+    instance.cleared_recipes = list(
+        Recipe.objects.filter(ingredients=instance).values_list(
+            "pk", flat=True
+        )
+    )
+
+
+@receiver(post_delete, sender=Ingredient)
+def reindex_cleared_recipes(sender, instance, **kwargs):
+    update_search_vector(
+        Recipe.objects.filter(pk__in=instance.cleared_recipes)
+    )
+
+
+@receiver(post_save, sender=ShoppingCard)
+def add_to_cart_totals(sender, instance, created, **kwargs):
+    if created:
+        change_cart_totals(instance.user_id, instance.recipe_id, 1)
+
+
+@receiver(pre_delete, sender=ShoppingCard)
+def subtract_from_cart_totals(sender, instance, **kwargs):
+    change_cart_totals(instance.user_id, instance.recipe_id, -1)
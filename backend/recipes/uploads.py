@@ -0,0 +1,71 @@
+import os
+
+from django.core.files.base import ContentFile
+from PIL import Image
+
+from recipes.models import ImageUpload
+
+READ_SIZE = 64 * 1024
+EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp")
+
+
+def start_upload(user, name, size):
+    """Создаёт пустой файл, который потом дописывается частями."""
+    upload = ImageUpload(user=user, size=size)
+    upload.file.save(
+        f"{upload.id.hex}{os.path.splitext(name)[1].lower()}",
+        ContentFile(b""),
+        save=False,
+    )
+    upload.save()
+    return upload
+
+
+def save_upload(user, uploaded_file):
+    """Сохраняет файл из multipart-запроса.
+
+    Django уже сбросил большой файл во временный файл на диске,
+    хранилище перемещает его без чтения в память.
+    """
+    upload = ImageUpload(
+        user=user,
+        size=uploaded_file.size,
+        received=uploaded_file.size,
+    )
+    extension = os.path.splitext(uploaded_file.name)[1].lower()
+    upload.file.save(f"{upload.id.hex}{extension}", uploaded_file, save=False)
+    upload.save()
+    return upload
+
+
+def write_chunk(upload, stream, start, length):
+    """Дописывает в файл length байт из потока начиная со start.
+
+    Возвращает число записанных байт: если клиент оборвал запрос,
+    загрузку можно продолжить с upload.received.
+    """
+    written = 0
+    with open(upload.file.path, "r+b") as file:
+        file.seek(start)
+        file.truncate()
+        while written < length:
+            chunk = stream.read(min(READ_SIZE, length - written))
+            if not chunk:
+                break
+            file.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def is_image(upload):
+    try:
+        with upload.file.open("rb") as file, Image.open(file) as image:
+            image.verify()
+    except Exception:
+        return False
+    return True
+
+
+def delete_upload(upload):
+    upload.file.delete(save=False)
+    upload.delete()
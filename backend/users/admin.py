@@ -4,7 +4,8 @@ from users.models import Follow, User
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ("email", "username", "first_name", "last_name", "password")
+    list_display = ("email", "username", "first_name", "last_name", "password",
+                    "recipes_count", "followers_count")
 
 
 @admin.register(Follow)
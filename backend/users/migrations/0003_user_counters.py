@@ -0,0 +1,42 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:03
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_followers_count(apps, schema_editor):
+    User = apps.get_model("users", "User")
+    Follow = apps.get_model("users", "Follow")
+    followers = (
+        Follow.objects
+        .filter(following=OuterRef("pk"))
+        .order_by()
+        .values("following")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    User.objects.update(followers_count=Coalesce(Subquery(followers), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_follow_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество рецептов'),
+        ),
+        migrations.RunPython(
+            fill_followers_count, migrations.RunPython.noop
+        ),
+    ]
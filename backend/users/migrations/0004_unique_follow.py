@@ -0,0 +1,41 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:20
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def dedupe_follows(apps, schema_editor):
+    User = apps.get_model("users", "User")
+    Follow = apps.get_model("users", "Follow")
+    keep = (
+        Follow.objects
+        .values("user", "following")
+        .annotate(keep=Min("id"))
+        .order_by()
+        .values("keep")
+    )
+    Follow.objects.exclude(id__in=keep).delete()
+    User.objects.update(followers_count=Coalesce(Subquery(
+        Follow.objects
+        .filter(following=OuterRef("pk"))
+        .order_by()
+        .values("following")
+        .annotate(total=Count("pk"))
+        .values("total")
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'following'), name='unique_follow'),
+        ),
+    ]
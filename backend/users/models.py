@@ -1,10 +1,11 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from foodgram.models import MaintainedFieldsMixin
 from users.validators import validate_username
 
 
-class User(AbstractUser):
+class User(MaintainedFieldsMixin, AbstractUser):
     email = models.EmailField(
         max_length=254,
         verbose_name="Электронная почта",
@@ -33,6 +34,17 @@ class User(AbstractUser):
         verbose_name="Пароль",
         blank=True,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name="Количество рецептов",
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name="Количество подписчиков",
+        default=0,
+        editable=False,
+    )
+    maintained_fields = ("recipes_count", "followers_count")
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username", "first_name", "last_name"]
 
@@ -58,3 +70,9 @@ class Follow(models.Model):
     class Meta:
         verbose_name = "Подписка"
         verbose_name_plural = "Подписки"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "following"],
+                name="unique_follow",
+            ),
+        ]